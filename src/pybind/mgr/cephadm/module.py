@@ -2,7 +2,8 @@ import json
 import errno
 import logging
 import time
-from threading import Event
+from collections import defaultdict, OrderedDict
+from threading import Event, Lock, RLock
 from functools import wraps
 
 import string
@@ -14,6 +15,7 @@ except ImportError:
 
 
 import datetime
+import hashlib
 import six
 import os
 import random
@@ -27,7 +29,7 @@ from ceph.deployment import inventory, translate
 from ceph.deployment.drive_group import DriveGroupSpec
 from ceph.deployment.drive_selection import selector
 
-from mgr_module import MgrModule
+from mgr_module import MgrModule, CommandResult
 import mgr_util
 import orchestrator
 from orchestrator import OrchestratorError, HostPlacementSpec, OrchestratorValidationError, HostSpec, \
@@ -56,6 +58,39 @@ DEFAULT_SSH_CONFIG = ('Host *\n'
 
 DATEFMT = '%Y-%m-%dT%H:%M:%S.%f'
 
+# where the cephadm script is pushed to on the managed hosts
+CEPHADM_REMOTE_DIR = '/var/lib/cephadm'
+
+# 'cephadm ls' daemon state -> DaemonDescription.status
+DAEMON_STATE_MAP = {
+    'running': 1,
+    'stopped': 0,
+    'error': -1,
+    'unknown': -1,
+}
+
+# seconds a container_image lookup is cached for
+CONTAINER_IMAGE_CACHE_TTL = 60
+
+# seconds a generated minimal ceph.conf is reused for
+MINIMAL_CONF_CACHE_TTL = 30
+
+# seconds a host's client.crash keyring is reused for
+CRASH_KEYRING_CACHE_TTL = 60
+
+# seconds the image id and ceph version of a pulled image are cached for
+IMAGE_ID_CACHE_TTL = 300
+
+# daemon types, in the order they are upgraded
+_UPGRADE_DAEMON_TYPES = ('mgr', 'mon', 'osd', 'rgw', 'mds')
+# daemon types that need an ok-to-stop check before being restarted
+_OK_TO_STOP_DAEMON_TYPES = frozenset(['mon', 'osd', 'mds'])
+
+_UPGRADE_HEALTH_CHECKS = ('UPGRADE_NO_STANDBY_MGR',
+                          'UPGRADE_FAILED_PULL')
+_STRAY_HEALTH_CHECKS = ('CEPHADM_STRAY_HOST',
+                        'CEPHADM_STRAY_DAEMON')
+
 # for py2 compat
 try:
     from tempfile import TemporaryDirectory # py3
@@ -90,18 +125,29 @@ def _name_to_entity_name(name):
     else:
         return name
 
+HOST_PART_RE = re.compile(r'^[a-zA-Z0-9-]+\Z')
+
 def assert_valid_host(name):
-    p = re.compile('^[a-zA-Z0-9-]+$')
     try:
         assert len(name) <= 250, 'name is too long (max 250 chars)'
-        parts = name.split('.')
         for part in name.split('.'):
             assert len(part) > 0, '.-delimited name component must not be empty'
             assert len(part) <= 63, '.-delimited name component must not be more than 63 chars'
-            assert p.match(part), 'name component must include only a-z, 0-9, and -'
+            assert HOST_PART_RE.match(part), 'name component must include only a-z, 0-9, and -'
     except AssertionError as e:
         raise OrchestratorError(e)
 
+def _random_suffix(n):
+    # type: (int) -> str
+    return ''.join(random.choices(string.ascii_lowercase, k=n))
+
+
+def _notify_completion_waiters():
+    # type: () -> None
+    if CephadmOrchestrator.instance is not None:
+        CephadmOrchestrator.instance._completion_event.set()
+
+
 class AsyncCompletion(orchestrator.Completion):
     def __init__(self,
                  _first_promise=None,  # type: Optional[orchestrator.Completion]
@@ -132,7 +178,7 @@ class AsyncCompletion(orchestrator.Completion):
         if self._on_complete_ is None:
             return None
 
-        def callback(result):
+        def finalize(result):
             try:
                 if self.update_progress:
                     assert self.progress_reference
@@ -141,9 +187,25 @@ class AsyncCompletion(orchestrator.Completion):
                 self._finalize(result)
             except Exception as e:
                 self.fail(e)
+            finally:
+                _notify_completion_waiters()
+
+        def callback(result):
+            # This runs in the pool's result handler thread, which
+            # serves all outstanding results.  Chained completions can
+            # be slow (e.g. they may run cephadm synchronously), so hand
+            # them back to the pool instead of blocking that thread.
+            try:
+                assert CephadmOrchestrator.instance
+                CephadmOrchestrator.instance._worker_pool.apply_async(
+                    finalize, (result,))
+            except Exception as e:
+                self.fail(e)
+                _notify_completion_waiters()
 
         def error_callback(e):
             self.fail(e)
+            _notify_completion_waiters()
 
         def run(value):
             def do_work(*args, **kwargs):
@@ -160,18 +222,25 @@ class AsyncCompletion(orchestrator.Completion):
                     else:
                         # Py2 only: _worker_pool doesn't call error_callback
                         self.fail(e)
+                        _notify_completion_waiters()
 
             assert CephadmOrchestrator.instance
             if self.many:
                 if not value:
                     logger.info('calling map_async without values')
                     callback([])
+                # hand out several items per task once there are many more
+                # items than workers, to cut down on queue round-trips
+                chunksize = max(1, len(value) // (
+                    CephadmOrchestrator.instance._worker_pool_size * 2 + 2))
                 if six.PY3:
                     CephadmOrchestrator.instance._worker_pool.map_async(do_work, value,
+                                                                    chunksize=chunksize,
                                                                     callback=callback,
                                                                     error_callback=error_callback)
                 else:
                     CephadmOrchestrator.instance._worker_pool.map_async(do_work, value,
+                                                                    chunksize=chunksize,
                                                                     callback=callback)
             else:
                 if six.PY3:
@@ -196,17 +265,21 @@ def ssh_completion(cls=AsyncCompletion, **c_kwargs):
     See ./HACKING.rst for a how-to
     """
     def decorator(f):
+        name = f.__name__
+        many = c_kwargs.get('many', False)
+
+        # built once here rather than as a new lambda on every call
+        def call_star(x):
+            return f(*x)
+
         @wraps(f)
         def wrapper(*args):
 
-            name = f.__name__
-            many = c_kwargs.get('many', False)
-
             # Some weired logic to make calling functions with multiple arguments work.
             if len(args) == 1:
                 [value] = args
                 if many and value and isinstance(value[0], tuple):
-                    return cls(on_complete=lambda x: f(*x), value=value, name=name, **c_kwargs)
+                    return cls(on_complete=call_star, value=value, name=name, **c_kwargs)
                 else:
                     return cls(on_complete=f, value=value, name=name, **c_kwargs)
             else:
@@ -220,7 +293,7 @@ def ssh_completion(cls=AsyncCompletion, **c_kwargs):
 
                     return cls(on_complete=call_self, value=value, name=name, **c_kwargs)
                 else:
-                    return cls(on_complete=lambda x: f(*x), value=args, name=name, **c_kwargs)
+                    return cls(on_complete=call_star, value=args, name=name, **c_kwargs)
 
 
         return wrapper
@@ -259,7 +332,10 @@ def trivial_completion(f):
 
 
 def trivial_result(val):
-    return AsyncCompletion(value=val, name='trivial_result')
+    # type: (Any) -> orchestrator.Completion
+    # The value is already known, so there is nothing to hand to the
+    # worker pool; a plain Completion avoids AsyncCompletion's setup.
+    return orchestrator.Completion(value=val)
 
 
 def with_daemons(daemon_type=None,
@@ -345,6 +421,29 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             'default': True,
             'desc': 'raise a health warning if the host check fails',
         },
+        {
+            'name': 'worker_pool_size',
+            'type': 'int',
+            'default': 10,
+            'min': 1,
+            'desc': 'number of threads used to run remote operations in parallel',
+        },
+        {
+            'name': 'ssh_connection_pool_size',
+            'type': 'int',
+            'default': 64,
+            'min': 1,
+            'desc': 'maximum number of SSH connections to keep open; the '
+                    'least recently used one is closed beyond that',
+        },
+        {
+            'name': 'ssh_control_persist',
+            'type': 'int',
+            'default': 300,
+            'min': 0,
+            'desc': 'seconds an idle, multiplexed SSH master connection is '
+                    'kept open (0 disables multiplexing)',
+        },
     ]
 
     def __init__(self, *args, **kwargs):
@@ -355,6 +454,24 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         self.run = True
         self.event = Event()
 
+        # set whenever an AsyncCompletion step finishes or fails
+        self._completion_event = Event()
+
+        # entity -> (time looked up, container_image)
+        self._container_image_cache = {}  # type: Dict[str, Tuple[float, str]]
+
+        # (time generated, minimal ceph.conf)
+        self._minimal_conf = None  # type: Optional[Tuple[float, str]]
+
+        # host -> (time fetched, client.crash keyring)
+        self._crash_keyrings = {}  # type: Dict[str, Tuple[float, str]]
+
+        # (osdmap epoch, osd id -> osd uuid)
+        self._osd_uuid_map = None  # type: Optional[Tuple[int, Dict[str, str]]]
+
+        # image name -> (time pulled, image id, ceph version)
+        self._image_id_cache = {}  # type: Dict[str, Tuple[float, str, str]]
+
         # for mypy which does not run the code
         if TYPE_CHECKING:
             self.ssh_config_file = None  # type: Optional[str]
@@ -365,20 +482,36 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             self.warn_on_stray_hosts = True
             self.warn_on_stray_daemons = True
             self.warn_on_failed_host_check = True
+            self.worker_pool_size = 0
+            self.ssh_connection_pool_size = 0
+            self.ssh_control_persist = 0
+
+        # open connections, least recently used first
+        self._cons = OrderedDict()  # type: OrderedDict[str, Tuple[remoto.backends.BaseConnection,remoto.backends.LegacyModuleExecute]]
+        self._cons_lock = Lock()
+        # host -> lock held for the whole of each remote call, see _con_lock()
+        self._con_locks = {}  # type: Dict[str, RLock]
+
+        # (sha256 of the cephadm script last written, python to run it
+        # with) for each host, keyed like self._cons
+        self._cephadm_pushed = {}  # type: Dict[str, Tuple[str, str]]
+
+        # (prometheus module url, generated prometheus config)
+        self._prometheus_config = None  # type: Optional[Tuple[Optional[str], str]]
+
+        # remote environment to run commands with, keyed like self._cons
+        self._remote_env = {}  # type: Dict[str, Dict[str, str]]
 
-        self._cons = {}  # type: Dict[str, Tuple[remoto.backends.BaseConnection,remoto.backends.LegacyModuleExecute]]
+        # private directory for the ssh config and identity files, and
+        # the ControlPath sockets of the multiplexed ssh master connections
+        self._ssh_dir = tempfile.mkdtemp(prefix='cephadm-ssh-')
 
         self.config_notify()
 
-        path = self.get_ceph_option('cephadm_path')
-        try:
-            with open(path, 'r') as f:
-                self._cephadm = f.read()
-        except (IOError, TypeError) as e:
-            raise RuntimeError("unable to read cephadm at '%s': %s" % (
-                path, str(e)))
+        self._load_cephadm()
 
-        self._worker_pool = multiprocessing.pool.ThreadPool(1)
+        self._worker_pool = multiprocessing.pool.ThreadPool(self.worker_pool_size)
+        self._worker_pool_size = self.worker_pool_size
 
         self._reconfig_ssh()
 
@@ -389,8 +522,10 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             self.upgrade_state = json.loads(t)
         else:
             self.upgrade_state = None
+        self._saved_upgrade_state = t  # type: Optional[str]
 
-        self.health_checks = {}
+        self.health_checks = {}  # type: Dict[str, Dict[str, Any]]
+        self._published_health_checks = None  # type: Optional[str]
 
         self.all_progress_references = list()  # type: List[orchestrator.ProgressReference]
 
@@ -400,7 +535,11 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             self.inventory = json.loads(i)
         else:
             self.inventory = dict()
-        self.log.debug('Loaded inventory %s' % self.inventory)
+        self.log.debug('Loaded inventory %s', self.inventory)
+
+        # daemon_cache updates not written to the store yet, host -> data
+        self._daemon_cache_pending = {}  # type: Dict[str, Any]
+        self._daemon_cache_lock = Lock()
 
         # The values are cached by instance.
         # cache is invalidated by
@@ -411,28 +550,35 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
 
         self.daemon_cache = orchestrator.OutdatablePersistentDict(
             self, self._STORE_HOST_PREFIX + '.daemons')
-
-        # ensure the host lists are in sync
-        for h in self.inventory.keys():
-            if h not in self.inventory_cache:
-                self.log.debug('adding inventory item for %s' % h)
-                self.inventory_cache[h] = orchestrator.OutdatableData()
-            if h not in self.daemon_cache:
-                self.log.debug('adding service item for %s' % h)
-                self.daemon_cache[h] = orchestrator.OutdatableData()
-        for h in self.inventory_cache:
-            if h not in self.inventory:
-                del self.inventory_cache[h]
-        for h in self.daemon_cache:
-            if h not in self.inventory:
-                del self.daemon_cache[h]
+        # (sha1, decoded) of the last 'cephadm ls' output seen for each
+        # host, so unchanged output need not be decoded again
+        self._daemon_ls = {}  # type: Dict[str, Tuple[str, Any]]
+
+        # ensure the host lists are in sync.  membership tests on the
+        # persistent caches scan the whole store, so diff key sets instead.
+        hosts = set(self.inventory.keys())
+        for what, cache in (('inventory', self.inventory_cache),
+                            ('daemon', self.daemon_cache)):
+            cached = cache.keys()
+            added = hosts - cached
+            removed = cached - hosts
+            if added or removed:
+                self.log.debug('%s cache: adding %d hosts, removing %d hosts',
+                               what, len(added), len(removed))
+            for h in added:
+                cache[h] = orchestrator.OutdatableData()
+            for h in removed:
+                del cache[h]
 
     def shutdown(self):
         self.log.info('shutdown')
+        self._reset_cons()
         self._worker_pool.close()
         self._worker_pool.join()
         self.run = False
         self.event.set()
+        self._flush_daemon_cache()
+        shutil.rmtree(self._ssh_dir, ignore_errors=True)
 
     def _kick_serve_loop(self):
         self.log.debug('_kick_serve_loop')
@@ -442,7 +588,7 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         # only wait a little bit; the service might go away for something
         tries = 4
         while tries > 0:
-            if s.daemon_type not in ['mon', 'osd', 'mds']:
+            if s.daemon_type not in _OK_TO_STOP_DAEMON_TYPES:
                 break
             ret, out, err = self.mon_command({
                 'prefix': '%s ok-to-stop' % s.daemon_type,
@@ -451,33 +597,30 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             if not self.upgrade_state or self.upgrade_state.get('paused'):
                 return False
             if ret:
-                self.log.info('Upgrade: It is NOT safe to stop %s.%s' %
-                              (s.daemon_type, s.daemon_id))
+                self.log.info('Upgrade: It is NOT safe to stop %s.%s',
+                              s.daemon_type, s.daemon_id)
                 time.sleep(15)
                 tries -= 1
             else:
-                self.log.info('Upgrade: It is safe to stop %s.%s' %
-                              (s.daemon_type, s.daemon_id))
+                self.log.info('Upgrade: It is safe to stop %s.%s',
+                              s.daemon_type, s.daemon_id)
                 return True
-        self.log.info('Upgrade: It is safe to stop %s.%s' %
-                      (s.daemon_type, s.daemon_id))
+        self.log.info('Upgrade: It is safe to stop %s.%s',
+                      s.daemon_type, s.daemon_id)
         return True
 
     def _clear_upgrade_health_checks(self):
-        for k in ['UPGRADE_NO_STANDBY_MGR',
-                  'UPGRADE_FAILED_PULL']:
+        for k in _UPGRADE_HEALTH_CHECKS:
             if k in self.health_checks:
                 del self.health_checks[k]
-        self.set_health_checks(self.health_checks)
 
     def _fail_upgrade(self, alert_id, alert):
-        self.log.error('Upgrade: Paused due to %s: %s' % (alert_id,
-                                                          alert['summary']))
+        self.log.error('Upgrade: Paused due to %s: %s',
+                       alert_id, alert['summary'])
         self.upgrade_state['error'] = alert_id + ': ' + alert['summary']
         self.upgrade_state['paused'] = True
         self._save_upgrade_state()
         self.health_checks[alert_id] = alert
-        self.set_health_checks(self.health_checks)
 
     def _do_upgrade(self, daemons):
         # type: (List[orchestrator.DaemonDescription]) -> Optional[AsyncCompletion]
@@ -489,7 +632,7 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         target_id = self.upgrade_state.get('target_id', None)
         if not target_id:
             # need to learn the container hash
-            self.log.info('Upgrade: First pull of %s' % target_name)
+            self.log.info('Upgrade: First pull of %s', target_name)
             try:
                 target_id, target_version = self._get_container_image_id(target_name)
             except OrchestratorError as e:
@@ -504,11 +647,13 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             self.upgrade_state['target_version'] = target_version
             self._save_upgrade_state()
         target_version = self.upgrade_state.get('target_version')
-        self.log.info('Upgrade: Target is %s with id %s' % (target_name,
-                                                            target_id))
+        self.log.info('Upgrade: Target is %s with id %s',
+                      target_name, target_id)
 
-        # get all distinct container_image settings
+        # get all distinct container_image settings, and group the
+        # per-daemon sections (e.g. 'osd.3') by daemon type
         image_settings = {}
+        daemon_sections = defaultdict(list)  # type: Dict[str, List[str]]
         ret, out, err = self.mon_command({
             'prefix': 'config dump',
             'format': 'json',
@@ -516,42 +661,59 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         config = json.loads(out)
         for opt in config:
             if opt['name'] == 'container_image':
-                image_settings[opt['section']] = opt['value']
-
-        for daemon_type in ['mgr', 'mon', 'osd', 'rgw', 'mds']:
-            self.log.info('Upgrade: Checking %s daemons...' % daemon_type)
+                section = opt['section']
+                image_settings[section] = opt['value']
+                if '.' in section:
+                    daemon_sections[section.split('.', 1)[0]].append(section)
+
+        versions = None  # type: Optional[Dict[str, Dict[str, int]]]
+
+        daemons_by_type = defaultdict(list)  # type: Dict[str, List[orchestrator.DaemonDescription]]
+        # hosts already running something from the target image have it
+        hosts_with_target = set()
+        for d in daemons:
+            daemons_by_type[d.daemon_type].append(d)
+            if d.container_image_id == target_id:
+                hosts_with_target.add(d.nodename)
+
+        for daemon_type in _UPGRADE_DAEMON_TYPES:
+            self.log.info('Upgrade: Checking %s daemons...', daemon_type)
             need_upgrade_self = False
-            for d in daemons:
-                if d.daemon_type != daemon_type:
-                    continue
+            for d in daemons_by_type.get(daemon_type, []):
                 if not d.container_image_id:
-                    self.log.debug('daemon %s.%s image_id is not known' % (
-                        daemon_type, d.daemon_id))
+                    self.log.debug('daemon %s.%s image_id is not known',
+                        daemon_type, d.daemon_id)
                     return None
                 if d.container_image_id == target_id:
-                    self.log.debug('daemon %s.%s version correct' % (
-                        daemon_type, d.daemon_id))
+                    self.log.debug('daemon %s.%s version correct',
+                        daemon_type, d.daemon_id)
                     continue
-                self.log.debug('daemon %s.%s version incorrect (%s, %s)' % (
+                self.log.debug('daemon %s.%s version incorrect (%s, %s)',
                     daemon_type, d.daemon_id,
-                    d.container_image_id, d.version))
+                    d.container_image_id, d.version)
 
                 if daemon_type == 'mgr' and \
                    d.daemon_id == self.get_mgr_id():
-                    self.log.info('Upgrade: Need to upgrade myself (mgr.%s)' %
+                    self.log.info('Upgrade: Need to upgrade myself (mgr.%s)',
                                   self.get_mgr_id())
                     need_upgrade_self = True
                     continue
 
                 # make sure host has latest container image
-                out, err, code = self._run_cephadm(
-                    d.nodename, None, 'inspect-image', [],
-                    image=target_name, no_fsid=True, error_ok=True)
-                self.log.debug('out %s code %s' % (out, code))
-                if code or json.loads(''.join(out)).get('image_id') != target_id:
-                    self.log.info('Upgrade: Pulling %s on %s' % (target_name,
-                                                                 d.nodename))
-                    out, err, code = self._run_cephadm(
+                image_id = None
+                if d.nodename in hosts_with_target:
+                    image_id = target_id
+                else:
+                    r, err, code = self._run_cephadm_json(
+                        d.nodename, None, 'inspect-image', [],
+                        image=target_name, no_fsid=True, error_ok=True)
+                    self.log.debug('out %s code %s', r, code)
+                    if not code:
+                        image_id = r.get('image_id')
+                if image_id != target_id:
+                    self.log.info('Upgrade: Pulling %s on %s',
+                                  target_name, d.nodename)
+                    r, err, code = self._run_cephadm_json(
                         d.nodename, None, 'pull', [],
                         image=target_name, no_fsid=True, error_ok=True)
                     if code:
@@ -564,23 +726,25 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                                                                   d.nodename)],
                         })
                         return None
-                    r = json.loads(''.join(out))
                     if r.get('image_id') != target_id:
-                        self.log.info('Upgrade: image %s pull on %s got new image %s (not %s), restarting' % (target_name, d.nodename, r['image_id'], target_id))
+                        self.log.info('Upgrade: image %s pull on %s got new image %s (not %s), restarting',
+                                      target_name, d.nodename, r['image_id'], target_id)
+                        self._image_id_cache.pop(target_name, None)
                         self.upgrade_state['image_id'] = r['image_id']
                         self._save_upgrade_state()
                         return None
 
                 if not self._wait_for_ok_to_stop(d):
                     return None
-                self.log.info('Upgrade: Redeploying %s.%s' %
-                              (d.daemon_type, d.daemon_id))
+                self.log.info('Upgrade: Redeploying %s.%s',
+                              d.daemon_type, d.daemon_id)
                 ret, out, err = self.mon_command({
                     'prefix': 'config set',
                     'name': 'container_image',
                     'value': target_name,
                     'who': daemon_type + '.' + d.daemon_id,
                 })
+                self._container_image_cache = {}
                 return self._daemon_action([(
                     d.daemon_type,
                     d.daemon_id,
@@ -604,7 +768,7 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                     return None
 
                 self.log.info('Upgrade: there are %d other already-upgraded '
-                              'standby mgrs, failing over' % num)
+                              'standby mgrs, failing over', num)
 
                 # fail over
                 ret, out, err = self.mon_command({
@@ -615,23 +779,25 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             elif daemon_type == 'mgr':
                 if 'UPGRADE_NO_STANDBY_MGR' in self.health_checks:
                     del self.health_checks['UPGRADE_NO_STANDBY_MGR']
-                    self.set_health_checks(self.health_checks)
 
-            # make sure 'ceph versions' agrees
-            ret, out, err = self.mon_command({
-                'prefix': 'versions',
-            })
-            j = json.loads(out)
-            self.log.debug('j %s' % j)
-            for version, count in j.get(daemon_type, {}).items():
+            # make sure 'ceph versions' agrees.  nothing has been
+            # redeployed if we got this far, so one query serves all
+            # daemon types.
+            if versions is None:
+                ret, out, err = self.mon_command({
+                    'prefix': 'versions',
+                })
+                versions = json.loads(out)
+                self.log.debug('versions %s', versions)
+            for version, count in versions.get(daemon_type, {}).items():
                 if version != target_version:
                     self.log.warning(
-                        'Upgrade: %d %s daemon(s) are %s != target %s' %
-                        (count, daemon_type, version, target_version))
+                        'Upgrade: %d %s daemon(s) are %s != target %s',
+                        count, daemon_type, version, target_version)
 
             # push down configs
             if image_settings.get(daemon_type) != target_name:
-                self.log.info('Upgrade: Setting container_image for all %s...' %
+                self.log.info('Upgrade: Setting container_image for all %s...',
                               daemon_type)
                 ret, out, err = self.mon_command({
                     'prefix': 'config set',
@@ -639,12 +805,10 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                     'value': target_name,
                     'who': daemon_type,
                 })
-            to_clean = []
-            for section in image_settings.keys():
-                if section.startswith(daemon_type + '.'):
-                    to_clean.append(section)
+                self._container_image_cache = {}
+            to_clean = daemon_sections.get(daemon_type, [])
             if to_clean:
-                self.log.info('Upgrade: Cleaning up container_image for %s...' %
+                self.log.info('Upgrade: Cleaning up container_image for %s...',
                               to_clean)
                 for section in to_clean:
                     ret, image, err = self.mon_command({
@@ -652,7 +816,8 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                         'name': 'container_image',
                         'who': section,
                     })
-            self.log.info('Upgrade: All %s daemons are up to date.' %
+                self._container_image_cache = {}
+            self.log.info('Upgrade: All %s daemons are up to date.',
                           daemon_type)
 
         # clean up
@@ -663,36 +828,47 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             'value': target_name,
             'who': 'global',
         })
-        for daemon_type in ['mgr', 'mon', 'osd', 'rgw', 'mds']:
+        for daemon_type in _UPGRADE_DAEMON_TYPES:
             ret, image, err = self.mon_command({
                 'prefix': 'config rm',
                 'name': 'container_image',
                 'who': daemon_type,
             })
+        self._container_image_cache = {}
 
         self.log.info('Upgrade: Complete!')
         self.upgrade_state = None
         self._save_upgrade_state()
         return None
 
+    def _check_host_one(self, host):
+        # type: (str) -> Optional[str]
+        """
+        Run check-host against one host; return a failure description or None
+        """
+        self.log.debug(' checking %s', host)
+        try:
+            out, err, code = self._run_cephadm(
+                host, 'client', 'check-host', [],
+                error_ok=True, no_fsid=True)
+            if code:
+                self.log.debug(' host %s failed check', host)
+                if self.warn_on_failed_host_check:
+                    return 'host %s failed check: %s' % (host, err)
+            else:
+                self.log.debug(' host %s ok', host)
+        except Exception as e:
+            self.log.debug(' host %s failed check', host)
+            return 'host %s failed check: %s' % (host, e)
+        return None
+
     def _check_hosts(self):
         self.log.debug('_check_hosts')
-        bad_hosts = []
-        for host, v in self.inventory.items():
-            self.log.debug(' checking %s' % host)
-            try:
-                out, err, code = self._run_cephadm(
-                    host, 'client', 'check-host', [],
-                    error_ok=True, no_fsid=True)
-                if code:
-                    self.log.debug(' host %s failed check' % host)
-                    if self.warn_on_failed_host_check:
-                        bad_hosts.append('host %s failed check: %s' % (host, err))
-                else:
-                    self.log.debug(' host %s ok' % host)
-            except Exception as e:
-                self.log.debug(' host %s failed check' % host)
-                bad_hosts.append('host %s failed check: %s' % (host, e))
+        # the checks are independent and bound by ssh round-trips, so
+        # run them on the worker pool
+        results = self._worker_pool.map(self._check_host_one,
+                                        list(self.inventory.keys()))
+        bad_hosts = [r for r in results if r]
         if 'CEPHADM_HOST_CHECK_FAILED' in self.health_checks:
             del self.health_checks['CEPHADM_HOST_CHECK_FAILED']
         if bad_hosts:
@@ -702,107 +878,133 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                 'count': len(bad_hosts),
                 'detail': bad_hosts,
             }
-        self.set_health_checks(self.health_checks)
 
     def _check_for_strays(self, daemons):
         self.log.debug('_check_for_strays')
-        for k in ['CEPHADM_STRAY_HOST',
-                  'CEPHADM_STRAY_DAEMON']:
+        for k in _STRAY_HEALTH_CHECKS:
             if k in self.health_checks:
                 del self.health_checks[k]
-        if self.warn_on_stray_hosts or self.warn_on_stray_daemons:
-            ls = self.list_servers()
-            managed = []
-            for s in daemons:
-                managed.append(s.name())
-            host_detail = []     # type: List[str]
-            host_num_daemons = 0
-            daemon_detail = []  # type: List[str]
-            for item in ls:
-                host = item.get('hostname')
-                daemons = item.get('services')  # misnomer!
-                missing_names = []
-                for s in daemons:
-                    name = '%s.%s' % (s.get('type'), s.get('id'))
-                    if host not in self.inventory:
-                        missing_names.append(name)
-                        host_num_daemons += 1
-                    if name not in managed:
-                        daemon_detail.append(
-                            'stray daemon %s on host %s not managed by cephadm' % (name, host))
-                if missing_names:
-                    host_detail.append(
-                        'stray host %s has %d stray daemons: %s' % (
-                            host, len(missing_names), missing_names))
-            if host_detail:
-                self.health_checks['CEPHADM_STRAY_HOST'] = {
-                    'severity': 'warning',
-                    'summary': '%d stray host(s) with %s daemon(s) '
-                    'not managed by cephadm' % (
-                        len(host_detail), host_num_daemons),
-                    'count': len(host_detail),
-                    'detail': host_detail,
-                }
-            if daemon_detail:
-                self.health_checks['CEPHADM_STRAY_DAEMON'] = {
-                    'severity': 'warning',
-                    'summary': '%d stray daemons(s) not managed by cephadm' % (
-                        len(daemon_detail)),
-                    'count': len(daemon_detail),
-                    'detail': daemon_detail,
-                }
+        warn_hosts = self.warn_on_stray_hosts
+        warn_daemons = self.warn_on_stray_daemons
+        if not warn_hosts and not warn_daemons:
+            return
+        ls = self.list_servers()
+        managed = {s.name() for s in daemons}
+        host_detail = []     # type: List[str]
+        host_num_daemons = 0
+        daemon_detail = []  # type: List[str]
+        inventory = self.inventory
+        for item in ls:
+            host = item.get('hostname')
+            host_daemons = item.get('services') or []  # misnomer!
+            stray_host = warn_hosts and host not in inventory
+            missing_names = []
+            for s in host_daemons:
+                name = '%s.%s' % (s.get('type'), s.get('id'))
+                if stray_host:
+                    missing_names.append(name)
+                    host_num_daemons += 1
+                if warn_daemons and name not in managed:
+                    daemon_detail.append(
+                        'stray daemon %s on host %s not managed by cephadm' % (name, host))
+            if missing_names:
+                host_detail.append(
+                    'stray host %s has %d stray daemons: %s' % (
+                        host, len(missing_names), missing_names))
+        if host_detail:
+            self.health_checks['CEPHADM_STRAY_HOST'] = {
+                'severity': 'warning',
+                'summary': '%d stray host(s) with %s daemon(s) '
+                'not managed by cephadm' % (
+                    len(host_detail), host_num_daemons),
+                'count': len(host_detail),
+                'detail': host_detail,
+            }
+        if daemon_detail:
+            self.health_checks['CEPHADM_STRAY_DAEMON'] = {
+                'severity': 'warning',
+                'summary': '%d stray daemons(s) not managed by cephadm' % (
+                    len(daemon_detail)),
+                'count': len(daemon_detail),
+                'detail': daemon_detail,
+            }
+
+    def _publish_health_checks(self):
+        # type: () -> None
+        """
+        Push self.health_checks to the mgr, if they changed since last time.
+
+        Updates to self.health_checks are batched up and published once
+        per serve() iteration.
+        """
+        encoded = json.dumps(self.health_checks, sort_keys=True)
+        if encoded == self._published_health_checks:
+            return
         self.set_health_checks(self.health_checks)
+        self._published_health_checks = encoded
 
     def _serve_sleep(self):
+        self._flush_daemon_cache()
+        self._publish_health_checks()
         sleep_interval = 600
         self.log.debug('Sleeping for %d seconds', sleep_interval)
         ret = self.event.wait(sleep_interval)
         self.event.clear()
 
+    def _wait_for_completion(self, completion, timeout=5.0):
+        # type: (orchestrator.Completion, float) -> None
+        """
+        Wait for a completion, waking up as soon as one of its asynchronous
+        steps finishes rather than polling for it.
+        """
+        while True:
+            # clear before checking, so a step finishing in between still
+            # wakes us up
+            self._completion_event.clear()
+            self.process([completion])
+            if completion.has_result or not completion.needs_result:
+                break
+            self._completion_event.wait(timeout)
+
     def serve(self):
         # type: () -> None
         self.log.info("serve starting")
         while self.run:
+            self._flush_daemon_cache()
             self._check_hosts()
 
             # refresh daemons
             self.log.debug('refreshing daemons')
             completion = self._get_daemons(maybe_refresh=True)
-            self._orchestrator_wait([completion])
+            self._wait_for_completion(completion)
             # FIXME: this is a band-aid to avoid crashing the mgr, but what
             # we really need to do here is raise health alerts for individual
             # hosts that fail and continue with the ones that do not fail.
             if completion.exception is not None:
-                self.log.error('failed to refresh daemons: %s' % completion.exception)
+                self.log.error('failed to refresh daemons: %s', completion.exception)
                 self.health_checks['CEPHADM_REFRESH_FAILED'] = {
                     'severity': 'warning',
                     'summary': 'failed to probe one or more hosts',
                     'count': 1,
                     'detail': [str(completion.exception)],
                 }
-                self.set_health_checks(self.health_checks)
                 self._serve_sleep()
                 continue
             if 'CEPHADM_REFRESH_FAILED' in self.health_checks:
                 del self.health_checks['CEPHADM_REFRESH_FAILED']
-                self.set_health_checks(self.health_checks)
             daemons = completion.result
-            self.log.debug('daemons %s' % daemons)
+            self.log.debug('daemons %s', daemons)
 
             self._check_for_strays(daemons)
 
             if self.upgrade_state and not self.upgrade_state.get('paused'):
                 completion = self._do_upgrade(daemons)
                 if completion:
-                    while not completion.has_result:
-                        self.process([completion])
-                        if completion.needs_result:
-                            time.sleep(1)
-                        else:
-                            break
+                    self._wait_for_completion(completion)
                     if completion.exception is not None:
                         self.log.error(str(completion.exception))
                 self.log.debug('did _do_upgrade')
+                self._publish_health_checks()
             else:
                 self._serve_sleep()
         self.log.info("serve exit")
@@ -812,54 +1014,117 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         This method is called whenever one of our config options is changed.
         """
         for opt in self.MODULE_OPTIONS:
-            setattr(self,
-                    opt['name'],  # type: ignore
-                    self.get_module_option(opt['name']))  # type: ignore
-            self.log.debug(' mgr option %s = %s',
-                           opt['name'], getattr(self, opt['name']))  # type: ignore
+            name = str(opt['name'])
+            # the names come from MODULE_OPTIONS itself, so skip
+            # get_module_option()'s validation scan over all of them
+            value = self._get_module_option(name, None)
+            if value != getattr(self, name, None):
+                self.log.debug(' mgr option %s = %s', name, value)
+            setattr(self, name, value)
         for opt in self.NATIVE_OPTIONS:
+            value = self.get_ceph_option(opt)
+            if value != getattr(self, opt, None):
+                self.log.debug(' native option %s = %s', opt, value)
             setattr(self,
                     opt,  # type: ignore
-                    self.get_ceph_option(opt))
-            self.log.debug(' native option %s = %s', opt, getattr(self, opt))  # type: ignore
+                    value)
+        self._resize_worker_pool()
+        if hasattr(self, '_cephadm'):
+            try:
+                self._load_cephadm()
+            except RuntimeError as e:
+                self.log.warning('keeping previously loaded cephadm: %s' % e)
+        self._container_image_cache = {}
+        self._minimal_conf = None
+        if hasattr(self, '_ssh_options') and \
+           self.ssh_control_persist != self._ssh_control_persist:
+            self._reconfig_ssh()
         self.event.set()
 
+    def _load_cephadm(self):
+        # type: () -> None
+        """
+        Read the cephadm script, unless it is unchanged since the last read
+        """
+        path = self.get_ceph_option('cephadm_path')
+        try:
+            mtime = os.stat(path).st_mtime
+            if getattr(self, '_cephadm_stat', None) == (path, mtime):
+                return
+            with open(path, 'r') as f:
+                self._cephadm = f.read()
+        except (IOError, OSError, TypeError) as e:
+            raise RuntimeError("unable to read cephadm at '%s': %s" % (
+                path, str(e)))
+        self._cephadm_stat = (path, mtime)
+        self._cephadm_sha = hashlib.sha256(
+            self._cephadm.encode('utf-8')).hexdigest()
+
+    def _resize_worker_pool(self):
+        # type: () -> None
+        """
+        Replace the worker pool if worker_pool_size changed.  Work already
+        queued on the old pool is allowed to drain.
+        """
+        if not hasattr(self, '_worker_pool'):
+            return  # still in __init__
+        if self._worker_pool_size == self.worker_pool_size:
+            return
+        self.log.info('resizing worker pool from %d to %d threads',
+                      self._worker_pool_size, self.worker_pool_size)
+        old_pool = self._worker_pool
+        self._worker_pool = multiprocessing.pool.ThreadPool(self.worker_pool_size)
+        self._worker_pool_size = self.worker_pool_size
+        old_pool.close()
+
     def notify(self, notify_type, notify_id):
-        pass
+        if notify_type == 'mon_map':
+            # the minimal config lists the mons
+            self._minimal_conf = None
 
     def get_unique_name(self, host, existing, prefix=None, forcename=None):
         # type: (str, List[orchestrator.DaemonDescription], Optional[str], Optional[str]) -> str
         """
         Generate a unique random service name
         """
+        existing_ids = set(d.daemon_id for d in existing)
         if forcename:
-            if len([d for d in existing if d.daemon_id == forcename]):
+            if forcename in existing_ids:
                 raise RuntimeError('specified name %s already in use', forcename)
             return forcename
 
         if '.' in host:
             host = host.split('.')[0]
+        if prefix:
+            base = prefix + '.' + host + '.'
+        else:
+            base = host + '.'
         while True:
-            if prefix:
-                name = prefix + '.'
-            else:
-                name = ''
-            name += host + '.' + ''.join(random.choice(string.ascii_lowercase)
-                            for _ in range(6))
-            if len([d for d in existing if d.daemon_id == name]):
-                self.log('name %s exists, trying again', name)
+            name = base + _random_suffix(6)
+            if name in existing_ids:
+                self.log.debug('name %s exists, trying again', name)
                 continue
             return name
 
     def _save_inventory(self):
-        self.set_store('inventory', json.dumps(self.inventory))
+        # written right away: the callers report success to the user, and
+        # the host must survive a mgr failover after that
+        self.set_store('inventory',
+                       json.dumps(self.inventory, separators=(',', ':')))
 
     def _save_upgrade_state(self):
-        self.set_store('upgrade_state', json.dumps(self.upgrade_state))
+        encoded = json.dumps(self.upgrade_state, separators=(',', ':'))
+        if encoded == self._saved_upgrade_state:
+            return
+        self.set_store('upgrade_state', encoded)
+        self._saved_upgrade_state = encoded
 
     def _reconfig_ssh(self):
-        temp_files = []  # type: list
+        # close connections (and ssh masters) made with the old options
+        self._reset_cons()
+
         ssh_options = []  # type: List[str]
+        ssh_files = set()
 
         # ssh_config
         ssh_config_fname = self.ssh_config_file
@@ -867,12 +1132,9 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         if ssh_config is not None or ssh_config_fname is None:
             if not ssh_config:
                 ssh_config = DEFAULT_SSH_CONFIG
-            f = tempfile.NamedTemporaryFile(prefix='cephadm-conf-')
-            os.fchmod(f.fileno(), 0o600)
-            f.write(ssh_config.encode('utf-8'))
-            f.flush()  # make visible to other processes
-            temp_files += [f]
-            ssh_config_fname = f.name
+            ssh_config_fname = self._ssh_file_path('ssh_config', ssh_config)
+            self._write_ssh_file(ssh_config_fname, ssh_config)
+            ssh_files.add(ssh_config_fname)
         if ssh_config_fname:
             if not os.path.isfile(ssh_config_fname):
                 raise Exception("ssh_config \"{}\" does not exist".format(
@@ -885,18 +1147,32 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         self.ssh_pub = ssh_pub
         self.ssh_key = ssh_key
         if ssh_key and ssh_pub:
-            tkey = tempfile.NamedTemporaryFile(prefix='cephadm-identity-')
-            tkey.write(ssh_key.encode('utf-8'))
-            os.fchmod(tkey.fileno(), 0o600)
-            tkey.flush()  # make visible to other processes
-            tpub = open(tkey.name + '.pub', 'w')
-            os.fchmod(tpub.fileno(), 0o600)
-            tpub.write(ssh_pub)
-            tpub.flush()  # make visible to other processes
-            temp_files += [tkey, tpub]
-            ssh_options += ['-i', tkey.name]
-
-        self._temp_files = temp_files
+            key_fname = self._ssh_file_path('identity', ssh_key, ssh_pub)
+            # ssh looks for the public key next to the private one
+            pub_fname = key_fname + '.pub'
+            self._write_ssh_file(key_fname, ssh_key)
+            self._write_ssh_file(pub_fname, ssh_pub)
+            ssh_files.update([key_fname, pub_fname])
+            ssh_options += ['-i', key_fname]
+
+        # drop files written for an earlier config or key
+        for fname in os.listdir(self._ssh_dir):
+            path = os.path.join(self._ssh_dir, fname)
+            if fname.startswith(('ssh_config-', 'identity-')) and \
+               path not in ssh_files:
+                os.unlink(path)
+
+        # reuse one ssh master connection per host across remoto sessions
+        if self.ssh_control_persist:
+            ssh_options += [
+                '-o', 'ControlMaster=auto',
+                '-o', 'ControlPersist=%d' % self.ssh_control_persist,
+                '-o', 'ControlPath=%s' % os.path.join(self._ssh_dir,
+                                                      '%C'),
+            ]
+        self._ssh_control_persist = self.ssh_control_persist
+
+        self._ssh_options_list = ssh_options
         if ssh_options:
             self._ssh_options = ' '.join(ssh_options)  # type: Optional[str]
         else:
@@ -908,21 +1184,97 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         elif self.mode == 'cephadm-package':
             self.ssh_user = 'cephadm'
 
-        self._reset_cons()
+    def _ssh_file_path(self, kind, *contents):
+        # type: (str, *str) -> str
+        """
+        Path in the private ssh directory for a file with the given
+        contents; named after their hash, so unchanged files are reused
+        """
+        h = hashlib.sha256()
+        for c in contents:
+            h.update(c.encode('utf-8'))
+        return os.path.join(self._ssh_dir,
+                            '%s-%s' % (kind, h.hexdigest()[:16]))
+
+    @staticmethod
+    def _write_ssh_file(path, content):
+        # type: (str, str) -> None
+        if os.path.exists(path):
+            return
+        # created with its final mode, so it is never readable by others
+        fd = os.open(path,
+                     os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                     getattr(os, 'O_CLOEXEC', 0),
+                     0o600)
+        try:
+            data = content.encode('utf-8')
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+
+    def _con_lock(self, host):
+        # type: (str) -> RLock
+        """
+        The lock serializing the remote calls to a host.  It is held while
+        the connection is used, so it is not closed under a running call.
+        """
+        with self._cons_lock:
+            lock = self._con_locks.get(host)
+            if lock is None:
+                lock = self._con_locks[host] = RLock()
+            return lock
 
     def _reset_con(self, host):
-        conn, r = self._cons.get(host, (None, None))
-        if conn:
-            self.log.debug('_reset_con close %s' % host)
-            conn.exit()
-            del self._cons[host]
+        with self._con_lock(host):
+            with self._cons_lock:
+                conn, r = self._cons.pop(host, (None, None))
+                self._cephadm_pushed.pop(host, None)
+                self._remote_env.pop(host, None)
+            if conn:
+                self.log.debug('_reset_con close %s' % host)
+                conn.exit()
+            # a dead or stale master would otherwise be reused by the next
+            # connection to the host
+            self._close_ssh_master(host)
 
     def _reset_cons(self):
-        for host, conn_and_r in self._cons.items():
-            self.log.debug('_reset_cons close %s' % host)
-            conn, r = conn_and_r
-            conn.exit()
-        self._cons = {}
+        with self._cons_lock:
+            cons = list(self._cons.items())
+            self._cons = OrderedDict()
+            self._cephadm_pushed = {}
+            self._remote_env = {}
+
+        def _close(host_and_con):
+            host, (conn, r) = host_and_con
+            with self._con_lock(host):
+                self.log.debug('_reset_cons close %s' % host)
+                conn.exit()
+                self._close_ssh_master(host)
+
+        # closing a connection (and its ssh master) is a network round-trip
+        # per host, so do them in parallel
+        if len(cons) > 1:
+            self._worker_pool.map(_close, cons)
+        else:
+            for c in cons:
+                _close(c)
+
+    def _close_ssh_master(self, host):
+        # type: (str) -> None
+        """
+        Ask the multiplexed ssh master for the host, if any, to exit
+        """
+        if not getattr(self, '_ssh_control_persist', 0):
+            return
+        try:
+            with open(os.devnull, 'w') as devnull:
+                subprocess.call(
+                    ['ssh'] + self._ssh_options_list +
+                    ['-O', 'exit', self.ssh_user + '@' + host],
+                    stdout=devnull, stderr=devnull)
+        except OSError as e:
+            self.log.debug('unable to close ssh master for %s: %s' % (host, e))
 
     @staticmethod
     def can_run():
@@ -943,7 +1295,10 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         Does nothing, as completions are processed in another thread.
         """
         if completions:
-            self.log.info("process: completions={0}".format(orchestrator.pretty_print(completions)))
+            # pretty_print walks every completion; skip it if nobody listens
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info("process: completions={0}".format(
+                    orchestrator.pretty_print(completions)))
 
             for p in completions:
                 p.finalize()
@@ -954,13 +1309,13 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         """
         if isinstance(hosts, six.string_types):
             hosts = [hosts]
-        keys = self.inventory_cache.keys()
-        unregistered_hosts = set(hosts) - keys
+        # self.inventory has the same hosts as inventory_cache, without
+        # having to load the cache from the store
+        unregistered_hosts = [h for h in hosts if h not in self.inventory]
         if unregistered_hosts:
-            logger.warning('keys = {}'.format(keys))
+            logger.warning('keys = {}'.format(list(self.inventory)))
             raise RuntimeError("Host(s) {} not registered".format(
-                ", ".join(map(lambda h: "'{}'".format(h),
-                    unregistered_hosts))))
+                ", ".join("'{}'".format(h) for h in unregistered_hosts)))
 
     @orchestrator._cli_write_command(
         prefix='cephadm set-ssh-config',
@@ -997,8 +1352,12 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             tmp_dir = TemporaryDirectory()
             path = tmp_dir.name + '/key'
             try:
-                subprocess.call([
+                # ed25519 keys are much quicker to generate than the
+                # default RSA ones
+                subprocess.check_call([
                     '/usr/bin/ssh-keygen',
+                    '-q',
+                    '-t', 'ed25519',
                     '-C', 'ceph-%s' % self._cluster_fsid,
                     '-N', '',
                     '-f', path
@@ -1008,8 +1367,6 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                 with open(path + '.pub', 'r') as f:
                     pub = f.read()
             finally:
-                os.unlink(path)
-                os.unlink(path + '.pub')
                 tmp_dir.cleanup()
             self.set_store('ssh_identity_key', secret)
             self.set_store('ssh_identity_pub', pub)
@@ -1061,13 +1418,24 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                     self.event.set()
         return 0, '%s (%s) ok' % (host, addr), err
 
+    def _host_addr(self, host):
+        # type: (str) -> str
+        """
+        The address to connect to for a host.  Connections (and everything
+        cached along with them) are keyed by this address.
+        """
+        return self.inventory.get(host, {}).get('addr', host)
+
     def _get_connection(self, host):
         """
         Setup a connection for running commands on remote host.
         """
-        conn_and_r = self._cons.get(host)
+        with self._cons_lock:
+            conn_and_r = self._cons.get(host)
+            if conn_and_r:
+                self._cons.move_to_end(host)
         if conn_and_r:
-            self.log.debug('Have connection to %s' % host)
+            self.log.debug('Have connection to %s', host)
             return conn_and_r
         n = self.ssh_user + '@' + host
         self.log.info("Opening connection to {} with ssh options '{}'".format(
@@ -1078,7 +1446,37 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             ssh_options=self._ssh_options)
 
         r = conn.import_module(remotes)
-        self._cons[host] = conn, r
+        close = []  # type: List[Tuple[str, Any, Optional[RLock]]]
+        with self._cons_lock:
+            existing = self._cons.get(host)
+            if existing:
+                # another thread connected meanwhile; use that connection
+                close.append((host, conn, None))
+                conn, r = existing
+                self._cons.move_to_end(host)
+            else:
+                self._cons[host] = conn, r
+            # evict least recently used first, skipping connections that a
+            # call is still using; they go once they are idle
+            for old_host in list(self._cons):
+                if len(self._cons) <= self.ssh_connection_pool_size:
+                    break
+                if old_host == host:
+                    continue
+                lock = self._con_locks.get(old_host)
+                if lock is not None and not lock.acquire(blocking=False):
+                    continue
+                old_conn, old_r = self._cons.pop(old_host)
+                self._cephadm_pushed.pop(old_host, None)
+                self._remote_env.pop(old_host, None)
+                close.append((old_host, old_conn, lock))
+        for old_host, old_conn, lock in close:
+            self.log.debug('closing connection to %s' % old_host)
+            try:
+                old_conn.exit()
+            finally:
+                if lock is not None:
+                    lock.release()
 
         return conn, r
 
@@ -1098,6 +1496,100 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             executable_path))
         return executable_path
 
+    def _cephadm_remote_path(self):
+        # type: () -> str
+        # outside of /var/lib/ceph/<fsid>: `cephadm ls` would report the
+        # script there as a daemon, and rm-cluster removes that directory
+        return os.path.join(CEPHADM_REMOTE_DIR, 'cephadm-' + self._cephadm_sha)
+
+    def _push_cephadm(self, host, addr, connr):
+        # type: (str, str, Any) -> str
+        """
+        Make sure the current cephadm script is present on the remote host,
+        and return the python interpreter to run it with
+        """
+        pushed = self._cephadm_pushed.get(addr)
+        if pushed and pushed[0] == self._cephadm_sha:
+            return pushed[1]
+        python = connr.choose_python()
+        if not python:
+            raise RuntimeError(
+                'unable to find python on %s (tried %s in %s)' % (
+                    host, remotes.PYTHONS, remotes.PATH))
+        path = self._cephadm_remote_path()
+        self.log.debug('writing cephadm to %s:%s', addr, path)
+        connr.write_file(path, self._cephadm, 0o700)
+        # drop the copies pushed by other versions of this module
+        connr.remove_other_files(CEPHADM_REMOTE_DIR, 'cephadm-',
+                                 os.path.basename(path))
+        self._cephadm_pushed[addr] = (self._cephadm_sha, python)
+        return python
+
+    def _get_remote_env(self, addr, conn):
+        # type: (str, remoto.backends.BaseConnection) -> Dict[str, str]
+        """
+        remoto.process.check() fetches the remote environment before every
+        command it is not given an env for, which is an extra round-trip
+        per command; fetch it once per connection instead.
+        """
+        env = self._remote_env.get(addr)
+        if env is None:
+            env = remoto.process.extend_env(conn, {})['env']
+            self._remote_env[addr] = env
+        return env
+
+    def _mon_commands(self, cmds):
+        # type: (List[Dict[str, Any]]) -> List[Tuple[int, str, str]]
+        """
+        Like mon_command(), for several independent commands: they are all
+        sent before waiting for any of them, so their round-trips overlap.
+        """
+        results = []
+        for cmd in cmds:
+            result = CommandResult()
+            self.send_command(result, 'mon', '', json.dumps(cmd), '')
+            results.append(result)
+        return [result.wait() for result in results]
+
+    def _get_cached_minimal_conf(self):
+        # type: () -> Optional[str]
+        """
+        The minimal ceph.conf handed to new daemons, if it was generated
+        less than MINIMAL_CONF_CACHE_TTL seconds ago and the monmap has
+        not changed since.
+        """
+        cached = self._minimal_conf
+        if cached and time.time() - cached[0] < MINIMAL_CONF_CACHE_TTL:
+            return cached[1]
+        return None
+
+    def _cache_minimal_conf(self, config):
+        # type: (str) -> str
+        self._minimal_conf = (time.time(), config)
+        return config
+
+    def _get_container_image(self, entity, refresh=False):
+        # type: (str, bool) -> str
+        """
+        Look up the container_image configured for an entity.  The value
+        rarely changes, so it is cached for CONTAINER_IMAGE_CACHE_TTL
+        seconds to save a mon round-trip per remote call.  Pass refresh
+        to bypass the cache, e.g. when (re)deploying a daemon.
+        """
+        who = _name_to_entity_name(entity)
+        now = time.time()
+        cached = self._container_image_cache.get(who)
+        if not refresh and cached and now - cached[0] < CONTAINER_IMAGE_CACHE_TTL:
+            return cached[1]
+        ret, image, err = self.mon_command({
+            'prefix': 'config get',
+            'who': who,
+            'key': 'container_image',
+        })
+        image = image.strip()
+        self._container_image_cache[who] = (now, image)
+        return image
+
     def _run_cephadm(self, host, entity, command, args,
                      addr=None,
                      stdin=None,
@@ -1107,74 +1599,88 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         """
         Run cephadm on the remote host with the given command + args
         """
-        if not addr and host in self.inventory:
-            addr = self.inventory[host].get('addr', host)
-        conn, connr = self._get_connection(addr)
+        if not addr:
+            addr = self._host_addr(host)
+        # one remote call per host at a time: remoto channels are not
+        # thread-safe, and the connection must stay open until we are done
+        with self._con_lock(addr):
+            conn, connr = self._get_connection(addr)
 
-        try:
-            if not image:
-                # get container image
-                ret, image, err = self.mon_command({
-                    'prefix': 'config get',
-                    'who': _name_to_entity_name(entity),
-                    'key': 'container_image',
-                })
-                image = image.strip()
-            self.log.debug('%s container image %s' % (entity, image))
+            try:
+                if not image:
+                    image = self._get_container_image(entity)
+                self.log.debug('%s container image %s', entity, image)
 
-            final_args = [
-                '--image', image,
-                command
-            ]
-            if not no_fsid:
-                final_args += ['--fsid', self._cluster_fsid]
-            final_args += args
-
-            if self.mode == 'root':
-                self.log.debug('args: %s' % (' '.join(final_args)))
-                self.log.debug('stdin: %s' % stdin)
-                script = 'injected_argv = ' + json.dumps(final_args) + '\n'
-                if stdin:
-                    script += 'injected_stdin = ' + json.dumps(stdin) + '\n'
-                script += self._cephadm
-                python = connr.choose_python()
-                if not python:
+                final_args = [
+                    '--image', image,
+                    command
+                ]
+                if not no_fsid:
+                    final_args += ['--fsid', self._cluster_fsid]
+                final_args += args
+
+                if self.mode == 'root':
+                    self.log.debug('args: %s', ' '.join(final_args))
+                    self.log.debug('stdin: %s', stdin)
+                    try:
+                        python = self._push_cephadm(host, addr, connr)
+                        path = self._cephadm_remote_path()
+                        cmd = [python, '-u', path] + final_args
+                        encoded_stdin = stdin.encode('utf-8') if stdin else None
+                        out, err, code = remoto.process.check(
+                            conn, cmd, stdin=encoded_stdin,
+                            env=self._get_remote_env(addr, conn))
+                        if code and any("can't open file" in line and path in line
+                                        for line in err):
+                            # the pushed script was removed behind our back
+                            # (e.g. by rm-cluster); push it again and retry
+                            self.log.info('cephadm is missing on %s, pushing it again',
+                                          host)
+                            self._cephadm_pushed.pop(addr, None)
+                            self._push_cephadm(host, addr, connr)
+                            out, err, code = remoto.process.check(
+                                conn, cmd, stdin=encoded_stdin,
+                                env=self._get_remote_env(addr, conn))
+                    except RuntimeError as e:
+                        self._reset_con(addr)
+                        if error_ok:
+                            return '', str(e), 1
+                        raise
+                elif self.mode == 'cephadm-package':
+                    try:
+                        out, err, code = remoto.process.check(
+                            conn,
+                            ['sudo', '/usr/bin/cephadm'] + final_args,
+                            stdin=stdin,
+                            env=self._get_remote_env(addr, conn))
+                    except RuntimeError as e:
+                        self._reset_con(addr)
+                        if error_ok:
+                            return '', str(e), 1
+                        raise
+                else:
+                    assert False, 'unsupported mode'
+
+                if code and not error_ok:
                     raise RuntimeError(
-                        'unable to find python on %s (tried %s in %s)' % (
-                            host, remotes.PYTHONS, remotes.PATH))
-                try:
-                    out, err, code = remoto.process.check(
-                        conn,
-                        [python, '-u'],
-                        stdin=script.encode('utf-8'))
-                except RuntimeError as e:
-                    self._reset_con(host)
-                    if error_ok:
-                        return '', str(e), 1
-                    raise
-            elif self.mode == 'cephadm-package':
-                try:
-                    out, err, code = remoto.process.check(
-                        conn,
-                        ['sudo', '/usr/bin/cephadm'] + final_args,
-                        stdin=stdin)
-                except RuntimeError as e:
-                    self._reset_con(host)
-                    if error_ok:
-                        return '', str(e), 1
-                    raise
-            else:
-                assert False, 'unsupported mode'
+                        'cephadm exited with an error code: %d, stderr:%s' % (
+                            code, '\n'.join(err)))
+                return out, err, code
 
-            if code and not error_ok:
-                raise RuntimeError(
-                    'cephadm exited with an error code: %d, stderr:%s' % (
-                        code, '\n'.join(err)))
-            return out, err, code
+            except Exception as ex:
+                self.log.exception(ex)
+                raise
 
-        except Exception as ex:
-            self.log.exception(ex)
-            raise
+    def _run_cephadm_json(self, host, entity, command, args, **kwargs):
+        """
+        Like _run_cephadm(), for commands that print JSON: on success the
+        output is returned decoded instead of as a list of lines.
+        """
+        out, err, code = self._run_cephadm(host, entity, command, args,
+                                           **kwargs)
+        if code:
+            return out, err, code
+        return json.loads(''.join(out)), err, code
 
     def _get_hosts(self, wanted=None):
         return self.inventory_cache.items_filtered(wanted)
@@ -1213,11 +1719,16 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
 
         :param host: host name
         """
+        addr = self._host_addr(host)
         del self.inventory[host]
         self._save_inventory()
         del self.inventory_cache[host]
+        with self._daemon_cache_lock:
+            self._daemon_cache_pending.pop(host, None)
+        self._crash_keyrings.pop(host, None)
         del self.daemon_cache[host]
-        self._reset_con(host)
+        self._daemon_ls.pop(host, None)
+        self._reset_con(addr)
         self.event.set()  # refresh stray health check
         return "Removed host '{}'".format(host)
 
@@ -1225,9 +1736,10 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
     def update_host_addr(self, host, addr):
         if host not in self.inventory:
             raise OrchestratorError('host %s not registered' % host)
+        old_addr = self._host_addr(host)
         self.inventory[host]['addr'] = addr
         self._save_inventory()
-        self._reset_con(host)
+        self._reset_con(old_addr)
         self.event.set()  # refresh stray health check
         return "Updated host '{}' addr to '{}'".format(host, addr)
 
@@ -1242,15 +1754,15 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         TODO:
           - InventoryNode probably needs to be able to report labels
         """
-        r = []
-        for hostname, info in self.inventory.items():
-            self.log.debug('host %s info %s' % (hostname, info))
-            r.append(orchestrator.InventoryNode(
+        self.log.debug('hosts %s', self.inventory)
+        return [
+            orchestrator.InventoryNode(
                 hostname,
                 addr=info.get('addr', hostname),
                 labels=info.get('labels', []),
-            ))
-        return r
+            )
+            for hostname, info in self.inventory.items()
+        ]
 
     @async_completion
     def add_host_label(self, host, label):
@@ -1280,11 +1792,19 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
     def _refresh_host_daemons(self, host):
         out, err, code = self._run_cephadm(
             host, 'mon', 'ls', [], no_fsid=True)
-        data = json.loads(''.join(out))
+        out = ''.join(out)
+        digest = hashlib.sha1(out.encode('utf-8')).hexdigest()
+        cached = self._daemon_ls.get(host)
+        if cached is not None and cached[0] == digest:
+            data = cached[1]
+        else:
+            data = json.loads(out)
+        now = datetime.datetime.utcnow().strftime(DATEFMT)
         for d in data:
-            d['last_refresh'] = datetime.datetime.utcnow().strftime(DATEFMT)
-        self.log.debug('Refreshed host %s daemons: %s' % (host, data))
+            d['last_refresh'] = now
+        self.log.debug('Refreshed host %s daemons: %s', host, data)
         self.daemon_cache[host] = orchestrator.OutdatableData(data)
+        self._daemon_ls[host] = (digest, data)
         return host, data
 
     def _get_daemons(self,
@@ -1294,78 +1814,85 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                      host=None,
                      refresh=False,
                      maybe_refresh=False):
-        hosts = []
+        if host is not None:
+            # do not query (and cache) a host that was never added
+            self._require_hosts(host)
+        self._flush_daemon_cache()
         wait_for_args = []
         daemons = {}
-        keys = None
-        if host is not None:
-            keys = [host]
-        for host, host_info in self.daemon_cache.items_filtered(keys):
-            hosts.append(host)
-            if refresh:
-                self.log.info("refreshing daemons for '{}'".format(host))
-                wait_for_args.append((host,))
-            elif maybe_refresh and host_info.outdated(self.daemon_cache_timeout):  # type: ignore
-                self.log.info("refreshing stale daemons for '{}'".format(host))
-                wait_for_args.append((host,))
-            elif not host_info.last_refresh:
-                daemons[host] = [
-                    {
-                        'name': '*.*',
-                        'style': 'cephadm:v1',
-                        'fsid': self._cluster_fsid,
-                    },
-                ]
-            else:
-                self.log.debug('have recent daemons for %s: %s' % (
-                    host, host_info.data))
-                daemons[host] = host_info.data
+        if refresh:
+            # everything is read again from the hosts, so don't bother
+            # loading the cached daemons; self.inventory has the same hosts
+            hosts = [host] if host is not None else list(self.inventory)
+            for h in hosts:
+                self.log.info("refreshing daemons for '{}'".format(h))
+                wait_for_args.append((h,))
+        else:
+            keys = [host] if host is not None else None
+            for host, host_info in self.daemon_cache.items_filtered(keys):
+                if maybe_refresh and host_info.outdated(self.daemon_cache_timeout):  # type: ignore
+                    self.log.info("refreshing stale daemons for '{}'".format(host))
+                    wait_for_args.append((host,))
+                elif not host_info.last_refresh:
+                    daemons[host] = [
+                        {
+                            'name': '*.*',
+                            'style': 'cephadm:v1',
+                            'fsid': self._cluster_fsid,
+                        },
+                    ]
+                else:
+                    self.log.debug('have recent daemons for %s: %s',
+                                   host, host_info.data)
+                    daemons[host] = host_info.data
 
         def _get_daemons_result(results):
             for host, data in results:
                 daemons[host] = data
 
             result = []
+            last_refresh = {}  # type: Dict[str, datetime.datetime]
+            fsid = self._cluster_fsid
+            service_prefix = service_name + '.' if service_name else None
             for host, ls in daemons.items():
                 for d in ls:
                     if not d['style'].startswith('cephadm'):
-                        self.log.debug('ignoring non-cephadm on %s: %s' % (host, d))
+                        self.log.debug('ignoring non-cephadm on %s: %s', host, d)
                         continue
-                    if d['fsid'] != self._cluster_fsid:
-                        self.log.debug('ignoring foreign daemon on %s: %s' % (host, d))
+                    if d['fsid'] != fsid:
+                        self.log.debug('ignoring foreign daemon on %s: %s', host, d)
                         continue
-                    self.log.debug('including %s %s' % (host, d))
-                    sd = orchestrator.DaemonDescription()
-                    if 'last_refresh' in d:
-                        sd.last_refresh = datetime.datetime.strptime(
-                            d['last_refresh'], DATEFMT)
-                    if '.' not in d['name']:
-                        self.log.debug('ignoring dot-less daemon on %s: %s' % (host, d))
+                    d_type, dot, d_id = d['name'].partition('.')
+                    if not dot:
+                        self.log.debug('ignoring dot-less daemon on %s: %s', host, d)
                         continue
-                    sd.daemon_type = d['name'].split('.')[0]
-                    if daemon_type and daemon_type != sd.daemon_type:
+                    if daemon_type and daemon_type != d_type:
                         continue
-                    sd.daemon_id = '.'.join(d['name'].split('.')[1:])
-                    if daemon_id and daemon_id != sd.daemon_id:
+                    if daemon_id and daemon_id != d_id:
                         continue
-                    if service_name and not sd.daemon_id.startswith(service_name + '.'):
+                    if service_prefix and not d_id.startswith(service_prefix):
                         continue
-                    sd.nodename = host
-                    sd.container_id = d.get('container_id')
-                    sd.container_image_name = d.get('container_image_name')
-                    sd.container_image_id = d.get('container_image_id')
-                    sd.version = d.get('version')
-                    if 'state' in d:
-                        sd.status_desc = d['state']
-                        sd.status = {
-                            'running': 1,
-                            'stopped': 0,
-                            'error': -1,
-                            'unknown': -1,
-                        }[d['state']]
-                    else:
-                        sd.status_desc = 'unknown'
-                        sd.status = None
+                    self.log.debug('including %s %s', host, d)
+                    dget = d.get
+                    state = dget('state')
+                    sd = orchestrator.DaemonDescription(
+                        daemon_type=d_type,
+                        daemon_id=d_id,
+                        nodename=host,
+                        container_id=dget('container_id'),
+                        container_image_id=dget('container_image_id'),
+                        container_image_name=dget('container_image_name'),
+                        version=dget('version'),
+                        status=DAEMON_STATE_MAP[state] if state else None,
+                        status_desc=state or 'unknown')
+                    if 'last_refresh' in d:
+                        # a host's daemons share one timestamp, so parse
+                        # each distinct one only once
+                        stamp = d['last_refresh']
+                        if stamp not in last_refresh:
+                            last_refresh[stamp] = datetime.datetime.strptime(
+                                stamp, DATEFMT)
+                        sd.last_refresh = last_refresh[stamp]
                     result.append(sd)
             return result
 
@@ -1433,8 +1960,8 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                 host, name, 'unit',
                 ['--name', name, a],
                 error_ok=True)
-            self.daemon_cache.invalidate(host)
             self.log.debug('_daemon_action code %s out %s' % (code, out))
+        self._update_daemon_cache(host)
         return "{} {} from host '{}'".format(action, name, host)
 
     def daemon_action(self, action, daemon_type, daemon_id):
@@ -1459,15 +1986,12 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
     def remove_daemons(self, names, force):
         # type: (List[str], bool) -> orchestrator.Completion
         def _filter(daemons):
+            wanted = set(names)
             args = []
             for d in daemons:
-                for name in names:
-                    if d.name() == name:
-                        args.append(
-                            ('%s.%s' % (d.daemon_type, d.daemon_id),
-                             d.nodename,
-                             force)
-                        )
+                name = d.name()
+                if name in wanted:
+                    args.append((name, d.nodename, force))
             if not args:
                 raise OrchestratorError('Unable to find daemon(s) %s' % (names))
             return self._remove_daemon(args)
@@ -1479,18 +2003,14 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         else:
             prefix = ''
         def _filter(daemons):
-            args = []
-            for d in daemons:
-                if d.daemon_type == service_type and \
-                   d.daemon_id.startswith(prefix):
-                    args.append(
-                        ('%s.%s' % (d.daemon_type, d.daemon_id), d.nodename)
-                    )
+            # _get_daemons already matched the type and service name
+            args = [(d.name(), d.nodename) for d in daemons]
             if not args:
                 raise OrchestratorError('Unable to find daemons in %s.%s* service' % (
                     service_type, prefix))
             return self._remove_daemon(args)
-        return self._get_daemons(daemon_type=service_type).then(_filter)
+        return self._get_daemons(daemon_type=service_type,
+                                 service_name=service_name).then(_filter)
 
     def get_inventory(self, node_filter=None, refresh=False):
         """
@@ -1515,11 +2035,10 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
 
             if host_info.outdated(self.inventory_cache_timeout) or refresh:
                 self.log.info("refresh stale inventory for '{}'".format(host))
-                out, err, code = self._run_cephadm(
+                data, err, code = self._run_cephadm_json(
                     host, 'osd',
                     'ceph-volume',
                     ['--', 'inventory', '--format=json'])
-                data = json.loads(''.join(out))
                 host_info = orchestrator.OutdatableData(data)
                 self.inventory_cache[host] = host_info
             else:
@@ -1554,10 +2073,20 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
 
     def get_osd_uuid_map(self):
         # type: () -> Dict[str,str]
+        """
+        Map of osd id to osd uuid.  Building it converts the whole osdmap
+        to python, so it is kept until the osdmap epoch changes; callers
+        must not modify it.
+        """
+        epoch = self.get_osdmap().get_epoch()
+        cached = self._osd_uuid_map
+        if cached and cached[0] == epoch:
+            return cached[1]
         osd_map = self.get('osd_map')
         r = {}
         for o in osd_map['osds']:
             r[str(o['osd'])] = o['uuid']
+        self._osd_uuid_map = (osd_map['epoch'], r)
         return r
 
     def call_inventory(self, hosts, drive_groups):
@@ -1577,25 +2106,23 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                             ):
         # type: (...) -> orchestrator.Completion
 
+        all_host_names = [x.name for x in all_hosts]
+        # FIXME: lazy-load the inventory from a InventoryNode object;
+        #        this would save one call to the inventory(at least externally)
+        inventory_by_host = {inv.name: inv for inv in inventory_list}
+
         for drive_group in drive_groups:
             self.log.info("Processing DriveGroup {}".format(drive_group))
             # 1) use fn_filter to determine matching_hosts
-            matching_hosts = drive_group.hosts([x.name for x in all_hosts])
-            # 2) Map the inventory to the InventoryNode object
-            # FIXME: lazy-load the inventory from a InventoryNode object;
-            #        this would save one call to the inventory(at least externally)
-
-            def _find_inv_for_host(hostname, inventory_list):
-                # This is stupid and needs to be loaded with the host
-                for _inventory in inventory_list:
-                    if _inventory.name == hostname:
-                        return _inventory
-                raise OrchestratorError("No inventory found for host: {}".format(hostname))
+            matching_hosts = drive_group.hosts(all_host_names)
 
             cmds = []
-            # 3) iterate over matching_host and call DriveSelection and to_ceph_volume
+            # 2) iterate over matching_host and call DriveSelection and to_ceph_volume
             for host in matching_hosts:
-                inventory_for_host = _find_inv_for_host(host, inventory_list)
+                # 3) Map the inventory to the InventoryNode object
+                inventory_for_host = inventory_by_host.get(host)
+                if inventory_for_host is None:
+                    raise OrchestratorError("No inventory found for host: {}".format(host))
                 drive_selection = selector.DriveSelection(drive_group, inventory_for_host.devices)
                 cmd = translate.to_ceph_volume(drive_group, drive_selection).run()
                 if not cmd:
@@ -1610,27 +2137,29 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
 
         self._require_hosts(host)
 
-        # get bootstrap key
-        ret, keyring, err = self.mon_command({
+        # get bootstrap key and generate config
+        config = self._get_cached_minimal_conf()
+        cmds = [{
             'prefix': 'auth get',
             'entity': 'client.bootstrap-osd',
-        })
-
-        # generate config
-        ret, config, err = self.mon_command({
-            "prefix": "config generate-minimal-conf",
-        })
+        }]
+        if config is None:
+            cmds.append({
+                "prefix": "config generate-minimal-conf",
+            })
+        results = [out for ret, out, err in self._mon_commands(cmds)]
+        keyring = results[0]
+        if config is None:
+            config = self._cache_minimal_conf(results[1])
 
         j = json.dumps({
             'config': config,
             'keyring': keyring,
         })
 
-        before_osd_uuid_map = self.get_osd_uuid_map()
+        before_osd_ids = set(self.get_osd_uuid_map())
 
-        split_cmd = cmd.split(' ')
-        _cmd = ['--config-and-keyring', '-', '--']
-        _cmd.extend(split_cmd)
+        _cmd = ['--config-and-keyring', '-', '--'] + cmd.split()
         out, err, code = self._run_cephadm(
             host, 'osd', 'ceph-volume',
             _cmd,
@@ -1638,28 +2167,27 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         self.log.debug('ceph-volume prepare: %s' % out)
 
         # check result
-        out, err, code = self._run_cephadm(
+        osds_elems, err, code = self._run_cephadm_json(
             host, 'osd', 'ceph-volume',
             [
                 '--',
                 'lvm', 'list',
                 '--format', 'json',
             ])
-        self.log.debug('code %s out %s' % (code, out))
-        osds_elems = json.loads('\n'.join(out))
+        self.log.debug('code %s out %s', code, osds_elems)
         fsid = self._cluster_fsid
         osd_uuid_map = self.get_osd_uuid_map()
+        # only osds that were not in the cluster before we ran prepare
+        new_osd_ids = set(osd_uuid_map) - before_osd_ids
         for osd_id, osds in osds_elems.items():
+            if osd_id not in new_osd_ids:
+                self.log.debug('osd id %s existed before or does not exist '
+                               'in cluster', osd_id)
+                continue
             for osd in osds:
                 if osd['tags']['ceph.cluster_fsid'] != fsid:
                     self.log.debug('mismatched fsid, skipping %s' % osd)
                     continue
-                if osd_id in before_osd_uuid_map:
-                    # this osd existed before we ran prepare
-                    continue
-                if osd_id not in osd_uuid_map:
-                    self.log.debug('osd id %d does not exist in cluster' % osd_id)
-                    continue
                 if osd_uuid_map[osd_id] != osd['tags']['ceph.osd_fsid']:
                     self.log.debug('mismatched osd uuid (cluster has %s, osd '
                                    'has %s)' % (
@@ -1678,48 +2206,17 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                        extra_args=None, extra_config=None,
                        reconfig=False,
                        osd_uuid_map=None):
-        if not extra_args:
-            extra_args = []
+        # callers may hand us a list they use again; do not extend it
+        extra_args = list(extra_args or [])
         name = '%s.%s' % (daemon_type, daemon_id)
 
         if daemon_type == 'prometheus':
             j = self._generate_prometheus_config()
             extra_args.extend(['--config-json', '-'])
         else:
-            # keyring
-            if not keyring:
-                if daemon_type == 'mon':
-                    ename = 'mon.'
-                else:
-                    ename = '%s.%s' % (daemon_type, daemon_id)
-                ret, keyring, err = self.mon_command({
-                    'prefix': 'auth get',
-                    'entity': ename,
-                })
-
-            # generate config
-            ret, config, err = self.mon_command({
-                "prefix": "config generate-minimal-conf",
-            })
-            if extra_config:
-                config += extra_config
-
-            if daemon_type != 'crash':
-                # crash_keyring
-                ret, crash_keyring, err = self.mon_command({
-                    'prefix': 'auth get-or-create',
-                    'entity': 'client.crash.%s' % host,
-                    'caps': ['mon', 'profile crash',
-                             'mgr', 'profile crash'],
-                })
-            else:
-                crash_keyring = None
-
-            j = json.dumps({
-                'config': config,
-                'keyring': keyring,
-                'crash_keyring': crash_keyring,
-            })
+            j = self._generate_config_and_keyrings(daemon_type, daemon_id,
+                                                   host, keyring,
+                                                   extra_config)
             extra_args.extend(['--config-and-keyrings', '-'])
 
             # osd deployments needs an --osd-uuid arg
@@ -1728,41 +2225,128 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                     osd_uuid_map = self.get_osd_uuid_map()
                 osd_uuid = osd_uuid_map.get(daemon_id, None)
                 if not osd_uuid:
-                    raise OrchestratorError('osd.%d not in osdmap' % daemon_id)
+                    raise OrchestratorError('osd.%s not in osdmap' % daemon_id)
                 extra_args.extend(['--osd-fsid', osd_uuid])
 
         if reconfig:
             extra_args.append('--reconfig')
 
+        # an image just set with 'ceph config set' must be honoured
+        # right away, so do not use the cached one
         out, err, code = self._run_cephadm(
             host, name, 'deploy',
             [
                 '--name', name,
             ] + extra_args,
-            stdin=j)
+            stdin=j,
+            image=self._get_container_image(name, refresh=True))
         self.log.debug('create_daemon code %s out %s' % (code, out))
-        if not code and host in self.daemon_cache:
+        if not code:
             # prime cached service state with what we (should have)
             # just created
-            sd = {
+            self._update_daemon_cache(host, remove=name, add={
                 'style': 'cephadm:v1',
-                'name': '%s.%s' % (daemon_type, daemon_id),
+                'name': name,
                 'fsid': self._cluster_fsid,
                 'enabled': True,
                 'state': 'running',
-            }
-            data = self.daemon_cache[host].data
-            if data:
-                data = [d for d in data if '%s.%s' % (daemon_type, daemon_id) != d['name']]
-                data.append(sd)
-            else:
-                data = [sd]
-            self.daemon_cache[host] = orchestrator.OutdatableData(data)
-        self.daemon_cache.invalidate(host)
+            })
+        else:
+            self._update_daemon_cache(host)
         self.event.set()
         return "{} {} on host '{}'".format(
             'Reconfigured' if reconfig else 'Deployed', name, host)
 
+    def _generate_config_and_keyrings(self, daemon_type, daemon_id, host,
+                                      keyring=None, extra_config=None):
+        # type: (str, str, str, Optional[str], Optional[str]) -> str
+        """
+        The --config-and-keyrings JSON handed to cephadm deploy for all
+        daemon types but prometheus.
+        """
+        # the config, keyring and crash keyring lookups are
+        # independent, so send them to the mons together
+        config = self._get_cached_minimal_conf()
+        cmds = []  # type: List[Dict[str, Any]]
+        if config is None:
+            cmds.append({
+                "prefix": "config generate-minimal-conf",
+            })
+        if not keyring:
+            if daemon_type == 'mon':
+                ename = 'mon.'
+            else:
+                ename = '%s.%s' % (daemon_type, daemon_id)
+            cmds.append({
+                'prefix': 'auth get',
+                'entity': ename,
+            })
+        crash_keyring = None
+        if daemon_type != 'crash':
+            # every daemon on a host gets the same crash keyring
+            now = time.time()
+            cached = self._crash_keyrings.get(host)
+            if cached and now - cached[0] < CRASH_KEYRING_CACHE_TTL:
+                crash_keyring = cached[1]
+            else:
+                cmds.append({
+                    'prefix': 'auth get-or-create',
+                    'entity': 'client.crash.%s' % host,
+                    'caps': ['mon', 'profile crash',
+                             'mgr', 'profile crash'],
+                })
+        results = [out for ret, out, err in self._mon_commands(cmds)]
+
+        if config is None:
+            config = self._cache_minimal_conf(results.pop(0))
+        if extra_config:
+            config += extra_config
+        if not keyring:
+            keyring = results.pop(0)
+        if daemon_type != 'crash' and crash_keyring is None:
+            crash_keyring = results.pop(0)
+            self._crash_keyrings[host] = (now, crash_keyring)
+
+        return json.dumps({
+            'config': config,
+            'keyring': keyring,
+            'crash_keyring': crash_keyring,
+        })
+
+    def _update_daemon_cache(self, host, remove=None, add=None):
+        # type: (str, Optional[str], Optional[Dict[str, Any]]) -> None
+        """
+        Drop the daemon named `remove` from the host's cached daemons,
+        append `add`, and mark the entry outdated.
+
+        The change is only recorded in memory; _flush_daemon_cache()
+        writes it out, so a batch of daemons deployed to or removed from
+        a host costs one store write for that host.
+        """
+        if host not in self.inventory:
+            return
+        with self._daemon_cache_lock:
+            if host in self._daemon_cache_pending:
+                data = self._daemon_cache_pending[host]
+            else:
+                data = self.daemon_cache[host].data
+            if data and remove:
+                data = [d for d in data if d['name'] != remove]
+            if add:
+                data = (data or []) + [add]
+            self._daemon_cache_pending[host] = data
+
+    def _flush_daemon_cache(self):
+        # type: () -> None
+        with self._daemon_cache_lock:
+            if not self._daemon_cache_pending:
+                return
+            for host, data in self._daemon_cache_pending.items():
+                if host in self.inventory:
+                    self.daemon_cache[host] = orchestrator.OutdatableData(data)
+                    self.daemon_cache.invalidate(host)
+            self._daemon_cache_pending = {}
+
     @async_map_completion
     def _remove_daemon(self, name, host, force=False):
         """
@@ -1775,13 +2359,11 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         out, err, code = self._run_cephadm(
             host, name, 'rm-daemon', args)
         self.log.debug('_remove_daemon code %s out %s' % (code, out))
-        if not code and host in self.daemon_cache:
+        if not code:
             # remove item from cache
-            data = self.daemon_cache[host].data
-            if data:
-                data = [d for d in data if d['name'] != name]
-                self.daemon_cache[host] = orchestrator.OutdatableData(data)
-        self.daemon_cache.invalidate(host)
+            self._update_daemon_cache(host, remove=name)
+        else:
+            self._update_daemon_cache(host)
         return "Removed {} from host '{}'".format(name, host)
 
     def _update_service(self, daemon_type, add_func, spec):
@@ -1811,7 +2393,8 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         prefix = f'{daemon_type}.{spec.name}'
         our_daemons = [d for d in daemons if d.name().startswith(prefix)]
         hosts_with_daemons = {d.nodename for d in daemons}
-        hosts_without_daemons = {p for p in spec.placement.hosts if p.hostname not in hosts_with_daemons}
+        # keep the placement order, so the first hosts listed are used first
+        hosts_without_daemons = [p for p in spec.placement.hosts if p.hostname not in hosts_with_daemons]
 
         for host, _, name in hosts_without_daemons:
             if (len(our_daemons) + num_added) >= spec.count:
@@ -1836,8 +2419,23 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         return create_func(args)
 
 
+    def _create_mons(self, hosts):
+        # type: (List[HostPlacementSpec]) -> orchestrator.Completion
+        """
+        Create new monitors on the given hosts.
+
+        All monitors share the mon. key, so it is fetched once here
+        instead of once per host in the worker pool.
+        """
+        ret, keyring, err = self.mon_command({
+            'prefix': 'auth get',
+            'entity': 'mon.',
+        })
+        return self._create_mon([(host, network, name, keyring)
+                                 for host, network, name in hosts])
+
     @async_map_completion
-    def _create_mon(self, host, network, name):
+    def _create_mon(self, host, network, name, keyring):
         """
         Create a new monitor on the given host.
         """
@@ -1846,12 +2444,6 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         self.log.info("create_mon({}:{}): starting mon.{}".format(
             host, network, name))
 
-        # get mon. key
-        ret, keyring, err = self.mon_command({
-            'prefix': 'auth get',
-            'entity': 'mon.',
-        })
-
         # infer whether this is a CIDR network, addrvec, or plain IP
         extra_config = '[mon.%s]\n' % name
         if '/' in network:
@@ -1876,19 +2468,21 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                 raise RuntimeError("Host '{}' is missing a network spec".format(host))
 
         def add_mons(daemons):
+            existing_ids = {d.daemon_id for d in daemons}
             for _, _, name in spec.placement.hosts:
-                if name and len([d for d in daemons if d.daemon_id == name]):
+                if name and name in existing_ids:
                     raise RuntimeError('name %s already exists', name)
 
             # explicit placement: enough hosts provided?
             if len(spec.placement.hosts) < spec.count:
                 raise RuntimeError("Error: {} hosts provided, expected {}".format(
                     len(spec.placement.hosts), spec.count))
-            self.log.info("creating {} monitors on hosts: '{}'".format(
-                spec.count, ",".join(map(lambda h: ":".join(h), spec.placement.hosts))))
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info("creating {} monitors on hosts: '{}'".format(
+                    spec.count, ",".join(map(lambda h: ":".join(h), spec.placement.hosts))))
             # TODO: we may want to chain the creation of the monitors so they join
             # the quorum one at a time.
-            return self._create_mon(spec.placement.hosts)
+            return self._create_mons(spec.placement.hosts)
 
         return self._get_daemons('mon').then(add_mons)
 
@@ -1917,9 +2511,9 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         if spec.count < num_mons:
             raise NotImplementedError("Removing monitors is not supported.")
 
-        self.log.debug("Trying to update monitors on: {}".format(spec.placement.hosts))
+        self.log.debug("Trying to update monitors on: %s", spec.placement.hosts)
         # check that all the hosts are registered
-        [self._require_hosts(host.hostname) for host in spec.placement.hosts]
+        self._require_hosts([host.hostname for host in spec.placement.hosts])
 
         # current support requires a network to be specified
         for host, network, _ in spec.placement.hosts:
@@ -1927,8 +2521,9 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                 raise RuntimeError("Host '{}' is missing a network spec".format(host))
 
         def update_mons_with_daemons(daemons):
+            existing_ids = {d.daemon_id for d in daemons}
             for _, _, name in spec.placement.hosts:
-                if name and len([d for d in daemons if d.daemon_id == name]):
+                if name and name in existing_ids:
                     raise RuntimeError('name %s alrady exists', name)
 
             # explicit placement: enough hosts provided?
@@ -1936,11 +2531,12 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
             if len(spec.placement.hosts) < num_new_mons:
                 raise RuntimeError("Error: {} hosts provided, expected {}".format(
                     len(spec.placement.hosts), num_new_mons))
-            self.log.info("creating {} monitors on hosts: '{}'".format(
-                num_new_mons, ",".join(map(lambda h: ":".join(h), spec.placement.hosts))))
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info("creating {} monitors on hosts: '{}'".format(
+                    num_new_mons, ",".join(map(lambda h: ":".join(h), spec.placement.hosts))))
             # TODO: we may want to chain the creation of the monitors so they join
             # the quorum one at a time.
-            return self._create_mon(spec.placement.hosts)
+            return self._create_mons(spec.placement.hosts)
         return self._get_daemons('mon').then(update_mons_with_daemons)
 
     @async_map_completion
@@ -1979,9 +2575,9 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         if spec.count == num_mgrs:
             return orchestrator.Completion(value="The requested number of managers exist.")
 
-        self.log.debug("Trying to update managers on: {}".format(spec.placement.hosts))
+        self.log.debug("Trying to update managers on: %s", spec.placement.hosts)
         # check that all the hosts are registered
-        [self._require_hosts(host.hostname) for host in spec.placement.hosts]
+        self._require_hosts([host.hostname for host in spec.placement.hosts])
 
         if spec.count < num_mgrs:
             num_to_remove = num_mgrs - spec.count
@@ -2024,16 +2620,14 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
                     "Error: {} hosts provided, expected {}".format(
                         len(spec.placement.hosts), num_new_mgrs))
 
+            existing_ids = {d.daemon_id for d in daemons}
             for host_spec in spec.placement.hosts:
-                if host_spec.name and len([d for d in daemons if d.daemon_id == host_spec.name]):
-                    raise RuntimeError('name %s alrady exists', host_spec.name)
-
-            for host_spec in spec.placement.hosts:
-                if host_spec.name and len([d for d in daemons if d.daemon_id == host_spec.name]):
+                if host_spec.name and host_spec.name in existing_ids:
                     raise RuntimeError('name %s alrady exists', host_spec.name)
 
-            self.log.info("creating {} managers on hosts: '{}'".format(
-                num_new_mgrs, ",".join([_spec.hostname for _spec in spec.placement.hosts])))
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info("creating {} managers on hosts: '{}'".format(
+                    num_new_mgrs, ",".join([_spec.hostname for _spec in spec.placement.hosts])))
 
             args = []
             for host_spec in spec.placement.hosts:
@@ -2149,6 +2743,11 @@ class CephadmOrchestrator(MgrModule, orchestrator.OrchestratorClientMixin):
         mgr_scrape_list = []
         # *** FIXME *** we should scrape all mgrs here ***
         t = mgr_map.get('services', {}).get('prometheus', None)
+        # the config only depends on the prometheus module's url
+        cached = self._prometheus_config
+        if cached and cached[0] == t:
+            return cached[1]
+        url = t
         if t:
             t = t.split('/')[2]
             mgr_scrape_list = [t]
@@ -2167,6 +2766,7 @@ scrape_configs:
     mgr_scrape_list=str(mgr_scrape_list)
     )
         })
+        self._prometheus_config = (url, j)
         return j
 
     def add_prometheus(self, spec):
@@ -2204,27 +2804,34 @@ scrape_configs:
         return self._update_service('prometheus', self.add_prometheus, spec)
 
     def _get_container_image_id(self, image_name):
+        # type: (str) -> Tuple[str, str]
+        """
+        Pull an image and return its id and ceph version.  Pulling is
+        slow, so the result is cached for IMAGE_ID_CACHE_TTL seconds, or
+        until an upgrade sees the image name resolve to a different id.
+        """
+        now = time.time()
+        cached = self._image_id_cache.get(image_name)
+        if cached and now - cached[0] < IMAGE_ID_CACHE_TTL:
+            return cached[1], cached[2]
         # pick a random host...
-        host = None
-        for host_name in self.inventory_cache:
-            host = host_name
-            break
+        host = next(iter(self.inventory), None)
         if not host:
             raise OrchestratorError('no hosts defined')
         self.log.debug('using host %s' % host)
-        out, err, code = self._run_cephadm(
+        j, err, code = self._run_cephadm_json(
             host, None, 'pull', [],
             image=image_name,
             no_fsid=True,
             error_ok=True)
         if code:
             raise OrchestratorError('Failed to pull %s on %s: %s' % (
-                image_name, host, '\n'.join(out)))
-        j = json.loads('\n'.join(out))
+                image_name, host, '\n'.join(j)))
         image_id = j.get('image_id')
         ceph_version = j.get('ceph_version')
         self.log.debug('image %s -> id %s version %s' %
                        (image_name, image_id, ceph_version))
+        self._image_id_cache[image_name] = (now, image_id, ceph_version)
         return image_id, ceph_version
 
     def upgrade_check(self, image, version):
@@ -2249,11 +2856,13 @@ scrape_configs:
             'needs_update': dict(),
             'up_to_date': list(),
         }
+        up_to_date = r['up_to_date']
+        needs_update = r['needs_update']
         for s in daemons:
             if target_id == s.container_image_id:
-                r['up_to_date'].append(s.name())
+                up_to_date.append(s.name())
             else:
-                r['needs_update'][s.name()] = {
+                needs_update[s.name()] = {
                     'current_name': s.container_image_name,
                     'current_id': s.container_image_id,
                     'current_version': s.version,
@@ -2280,47 +2889,43 @@ scrape_configs:
         else:
             raise OrchestratorError('must specify either image or version')
         if self.upgrade_state:
-            if self.upgrade_state.get('target_name') != target_name:
+            current = self.upgrade_state.get('target_name')
+            if current != target_name:
                 raise OrchestratorError(
-                    'Upgrade to %s (not %s) already in progress' %
-                (self.upgrade_state.get('target_name'), target_name))
+                    f'Upgrade to {current} (not {target_name}) already in progress')
             if self.upgrade_state.get('paused'):
-                del self.upgrade_state['paused']
+                self.upgrade_state.pop('paused', None)
                 self._save_upgrade_state()
-                return trivial_result('Resumed upgrade to %s' %
-                                      self.upgrade_state.get('target_name'))
-            return trivial_result('Upgrade to %s in progress' %
-                                  self.upgrade_state.get('target_name'))
+                return trivial_result(f'Resumed upgrade to {current}')
+            return trivial_result(f'Upgrade to {current} in progress')
         self.upgrade_state = {
             'target_name': target_name,
         }
         self._save_upgrade_state()
         self._clear_upgrade_health_checks()
         self.event.set()
-        return trivial_result('Initiating upgrade to %s' % (image))
+        return trivial_result(f'Initiating upgrade to {target_name}')
 
     def upgrade_pause(self):
         if not self.upgrade_state:
             raise OrchestratorError('No upgrade in progress')
+        target_name = self.upgrade_state.get('target_name')
         if self.upgrade_state.get('paused'):
-            return trivial_result('Upgrade to %s already paused' %
-                                  self.upgrade_state.get('target_name'))
+            return trivial_result(f'Upgrade to {target_name} already paused')
         self.upgrade_state['paused'] = True
         self._save_upgrade_state()
-        return trivial_result('Paused upgrade to %s' %
-                              self.upgrade_state.get('target_name'))
+        return trivial_result(f'Paused upgrade to {target_name}')
 
     def upgrade_resume(self):
         if not self.upgrade_state:
             raise OrchestratorError('No upgrade in progress')
+        target_name = self.upgrade_state.get('target_name')
         if not self.upgrade_state.get('paused'):
-            return trivial_result('Upgrade to %s not paused' %
-                                  self.upgrade_state.get('target_name'))
-        del self.upgrade_state['paused']
+            return trivial_result(f'Upgrade to {target_name} not paused')
+        self.upgrade_state.pop('paused', None)
         self._save_upgrade_state()
         self.event.set()
-        return trivial_result('Resumed upgrade to %s' %
-                              self.upgrade_state.get('target_name'))
+        return trivial_result(f'Resumed upgrade to {target_name}')
 
     def upgrade_stop(self):
         if not self.upgrade_state:
@@ -2330,7 +2935,7 @@ scrape_configs:
         self._save_upgrade_state()
         self._clear_upgrade_health_checks()
         self.event.set()
-        return trivial_result('Stopped upgrade to %s' % target_name)
+        return trivial_result(f'Stopped upgrade to {target_name}')
 
 
 class BaseScheduler(object):
@@ -2354,8 +2959,8 @@ class BaseScheduler(object):
 class SimpleScheduler(BaseScheduler):
     """
     The most simple way to pick/schedule a set of hosts.
-    1) Shuffle the provided host_pool
-    2) Select from list up to :count
+    1) Randomly select up to :count hosts from the provided host_pool
+    2) Wrap only the selected hosts
     """
     def __init__(self, placement_spec):
         super(SimpleScheduler, self).__init__(placement_spec)
@@ -2364,10 +2969,11 @@ class SimpleScheduler(BaseScheduler):
         # type: (List, Optional[int]) -> List[HostPlacementSpec]
         if not host_pool:
             raise Exception('List of host candidates is empty')
-        host_pool = [HostPlacementSpec(x, '', '') for x in host_pool]
-        # shuffle for pseudo random selection
-        random.shuffle(host_pool)
-        return host_pool[:count]
+        if count is None:
+            count = len(host_pool)
+        # pseudo random selection, without shuffling the whole pool
+        picked = random.sample(host_pool, min(count, len(host_pool)))
+        return [HostPlacementSpec(x, '', '') for x in picked]
 
 
 class NodeAssignment(object):
@@ -2382,16 +2988,29 @@ class NodeAssignment(object):
     """
 
     def __init__(self,
-                 spec=None,  # type: Optional[orchestrator.ServiceSpec]
+                 spec,  # type: orchestrator.ServiceSpec
+                 get_hosts_func,  # type: Callable
+                 service_type,  # type: str
                  scheduler=None,  # type: Optional[BaseScheduler]
-                 get_hosts_func=None,  # type: Optional[Callable]
-                 service_type=None,  # type: Optional[str]
                  ):
-        assert spec and get_hosts_func and service_type
         self.spec = spec  # type: orchestrator.ServiceSpec
         self.scheduler = scheduler if scheduler else SimpleScheduler(self.spec.placement)
         self.get_hosts_func = get_hosts_func
         self.daemon_type = service_type
+        self._all_hosts = None  # type: Optional[List[str]]
+
+    def get_all_hosts(self):
+        # type: () -> List[str]
+        """
+        Names of all hosts in the inventory, without duplicates and in
+        inventory order.  They are only fetched once per NodeAssignment,
+        which lives for a single load().
+        """
+        if self._all_hosts is None:
+            # duplicates would skew the scheduler's random selection
+            self._all_hosts = list(OrderedDict.fromkeys(
+                x[0] for x in self.get_hosts_func()))
+        return self._all_hosts
 
     def load(self):
         # type: () -> orchestrator.ServiceSpec
@@ -2410,11 +3029,12 @@ class NodeAssignment(object):
         # Querying for labeled nodes doesn't work currently.
         # Leaving this open for the next iteration
         # NOTE: This currently queries for all hosts without label restriction
-        if self.spec.placement.label:
+        placement = self.spec.placement
+        if placement.label:
             logger.info("Found labels. Assinging nodes that match the label")
-            candidates = [HostPlacementSpec(x[0], '', '') for x in self.get_hosts_func()]  # TODO: query for labels
-            logger.info('Assigning nodes to spec: {}'.format(candidates))
-            self.spec.placement.set_hosts(candidates)
+            candidates = [HostPlacementSpec(x, '', '') for x in self.get_all_hosts()]  # TODO: query for labels
+            logger.info('Assigning nodes to spec: %s', candidates)
+            placement.set_hosts(candidates)
 
     def assign_nodes(self):
         # type: () -> None
@@ -2423,27 +3043,23 @@ class NodeAssignment(object):
         """
         # If no imperative or declarative host assignments, use the scheduler to pick from the
         # host pool (assuming `count` is set)
-        if not self.spec.placement.label and not self.spec.placement.hosts and self.spec.placement.count:
+        placement = self.spec.placement
+        if not placement.label and not placement.hosts and placement.count:
             logger.info("Found num spec. Looking for labeled nodes.")
-            # TODO: actually query for labels (self.daemon_type)
-            candidates = self.scheduler.place([x[0] for x in self.get_hosts_func()],
-                                              count=self.spec.placement.count)
-            # Not enough nodes to deploy on
-            if len(candidates) != self.spec.placement.count:
-                logger.warning("Did not find enough labeled nodes to \
-                               scale to <{}> services. Falling back to unlabeled nodes.".
-                               format(self.spec.placement.count))
-            else:
-                logger.info('Assigning nodes to spec: {}'.format(candidates))
-                self.spec.placement.set_hosts(candidates)
-                return None
-
-            candidates = self.scheduler.place([x[0] for x in self.get_hosts_func()], count=self.spec.placement.count)
-            # Not enough nodes to deploy on
-            if len(candidates) != self.spec.placement.count:
+            # TODO: actually query for labels (self.daemon_type); until
+            # then labeled and unlabeled nodes are the same pool, so a
+            # single placement attempt is enough
+            all_hosts = self.get_all_hosts()
+            # Not enough nodes to deploy on; no need to ask the scheduler
+            if len(all_hosts) < placement.count:
+                raise OrchestratorValidationError("Cannot place {} daemons on {} hosts.".
+                                                  format(placement.count, len(all_hosts)))
+            candidates = self.scheduler.place(all_hosts, count=placement.count)
+            # a scheduler may still reject some of the hosts
+            if len(candidates) != placement.count:
                 raise OrchestratorValidationError("Cannot place {} daemons on {} hosts.".
-                                                  format(self.spec.placement.count, len(candidates)))
+                                                  format(placement.count, len(candidates)))
 
-            logger.info('Assigning nodes to spec: {}'.format(candidates))
-            self.spec.placement.set_hosts(candidates)
+            logger.info('Assigning nodes to spec: %s', candidates)
+            placement.set_hosts(candidates)
             return None
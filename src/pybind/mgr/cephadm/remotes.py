@@ -22,6 +22,41 @@ def choose_python():
                 return p
     return None
 
+def write_file(path, content, mode):
+    """
+    Atomically write content to path, creating the parent directory
+    """
+    dirname = os.path.dirname(path)
+    try:
+        os.makedirs(dirname)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    fd, tmp_path = tempfile.mkstemp(dir=dirname)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def remove_other_files(dirname, prefix, keep):
+    """
+    Remove the files in dirname whose name starts with prefix, except keep
+    """
+    try:
+        names = os.listdir(dirname)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix) and name != keep:
+            try:
+                os.unlink(os.path.join(dirname, name))
+            except OSError:
+                pass
+
 if __name__ == '__channelexec__':
     for item in channel:  # type: ignore
         channel.send(eval(item))  # type: ignore
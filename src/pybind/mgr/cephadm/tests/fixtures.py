@@ -30,9 +30,20 @@ def get_store_prefix(self, prefix):
 def get_ceph_option(_, key):
     return __file__
 
+
+def get_module_option(self, key, default=None):
+    return self.MODULE_OPTION_DEFAULTS.get(key, default)
+
+
+def _get_module_option(self, key, default, localized_prefix=""):
+    return self.MODULE_OPTION_DEFAULTS.get(key, default)
+
+
 @pytest.yield_fixture()
 def cephadm_module():
     with mock.patch("cephadm.module.CephadmOrchestrator.get_ceph_option", get_ceph_option),\
+            mock.patch("cephadm.module.CephadmOrchestrator.get_module_option", get_module_option),\
+            mock.patch("cephadm.module.CephadmOrchestrator._get_module_option", _get_module_option),\
             mock.patch("cephadm.module.CephadmOrchestrator._configure_logging", lambda *args: None),\
             mock.patch("cephadm.module.CephadmOrchestrator.remote"),\
             mock.patch("cephadm.module.CephadmOrchestrator.set_store", set_store),\
@@ -1,6 +1,8 @@
 import json
+import os
 from contextlib import contextmanager
 import fnmatch
+import threading
 
 import pytest
 
@@ -12,9 +14,11 @@ except ImportError:
     pass
 
 from orchestrator import ServiceDescription, DaemonDescription, InventoryNode, \
-    ServiceSpec, PlacementSpec, RGWSpec, HostSpec, OrchestratorError
+    ServiceSpec, PlacementSpec, RGWSpec, HostSpec, OrchestratorError, \
+    OrchestratorValidationError
 from tests import mock
 from .fixtures import cephadm_module, wait
+from ..module import assert_valid_host, SimpleScheduler, NodeAssignment
 
 
 """
@@ -35,11 +39,60 @@ def mon_command(*args, **kwargs):
     return 0, '', ''
 
 
+def send_command(result, *args, **kwargs):
+    result.complete(0, '', '')
+
+
 def match_glob(val, pat):
     ok = fnmatch.fnmatchcase(val, pat)
     if not ok:
         assert pat in val
 
+@pytest.mark.parametrize("name,valid", [
+    ('myhost', True),
+    ('my-host.example.com', True),
+    ('my_host', False),
+    ('myhost.', False),
+    ('myhost\n', False),
+    ('a' * 64, False),
+])
+def test_assert_valid_host(name, valid):
+    if valid:
+        assert_valid_host(name)
+    else:
+        with pytest.raises(OrchestratorError):
+            assert_valid_host(name)
+
+
+@pytest.mark.parametrize("count,expected", [
+    (None, 3),
+    (2, 2),
+    (5, 3),
+])
+def test_simple_scheduler(count, expected):
+    hosts = SimpleScheduler(PlacementSpec()).place(['a', 'b', 'c'], count=count)
+    assert len(hosts) == expected
+    assert len({h.hostname for h in hosts}) == expected
+    assert {h.hostname for h in hosts} <= {'a', 'b', 'c'}
+
+
+def test_node_assignment_count():
+    get_hosts = mock.Mock(return_value=[('a', None), ('b', None), ('c', None)])
+    spec = NodeAssignment(spec=ServiceSpec(placement=PlacementSpec(count=2)),
+                          get_hosts_func=get_hosts, service_type='mgr').load()
+    assert len(spec.placement.hosts) == 2
+    assert get_hosts.call_count == 1
+
+    with pytest.raises(OrchestratorValidationError):
+        NodeAssignment(spec=ServiceSpec(placement=PlacementSpec(count=4)),
+                       get_hosts_func=get_hosts, service_type='mgr').load()
+
+    get_hosts.return_value.append(('c', None))
+    with pytest.raises(OrchestratorValidationError):
+        NodeAssignment(spec=ServiceSpec(placement=PlacementSpec(count=4)),
+                       get_hosts_func=get_hosts, service_type='mgr').load()
+
+
 class TestCephadm(object):
 
     @contextmanager
@@ -69,6 +122,14 @@ class TestCephadm(object):
             c = cephadm_module.list_daemons(refresh=True)
             assert wait(cephadm_module, c) == []
 
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm")
+    def test_service_ls_unknown_host(self, _run_cephadm, cephadm_module):
+        for refresh in (False, True):
+            with pytest.raises(RuntimeError):
+                cephadm_module.list_daemons(host='notregistered', refresh=refresh)
+        _run_cephadm.assert_not_called()
+        assert 'notregistered' not in cephadm_module.daemon_cache
+
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
     def test_device_ls(self, cephadm_module):
         with self._with_host(cephadm_module, 'test'):
@@ -87,7 +148,7 @@ class TestCephadm(object):
             )
         ])
     ))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_daemon_action(self, _send_command, _get_connection, cephadm_module):
@@ -104,7 +165,7 @@ class TestCephadm(object):
 
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_mon_update(self, _send_command, _get_connection, cephadm_module):
@@ -114,7 +175,7 @@ class TestCephadm(object):
             assert wait(cephadm_module, c) == ["Deployed mon.a on host 'test'"]
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_mgr_update(self, _send_command, _get_connection, cephadm_module):
@@ -126,7 +187,7 @@ class TestCephadm(object):
 
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_create_osds(self, _send_command, _get_connection, cephadm_module):
@@ -156,7 +217,7 @@ class TestCephadm(object):
             assert out == ["Removed osd.0 from host 'test'"]
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_mds(self, _send_command, _get_connection, cephadm_module):
@@ -167,7 +228,7 @@ class TestCephadm(object):
             match_glob(out, "Deployed mds.name.* on host 'test'")
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_rgw(self, _send_command, _get_connection, cephadm_module):
@@ -180,7 +241,7 @@ class TestCephadm(object):
 
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_rgw_update(self, _send_command, _get_connection, cephadm_module):
@@ -198,7 +259,7 @@ class TestCephadm(object):
                 match_glob(out, "Deployed rgw.realm.zone1.host2.* on host 'host2'")
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_rgw_update_fail(self, _send_command, _get_connection, cephadm_module):
@@ -262,7 +323,7 @@ class TestCephadm(object):
             assert out == ["Removed rgw.myrgw.foobar from host 'test'"]
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_rbd_mirror(self, _send_command, _get_connection, cephadm_module):
@@ -274,7 +335,7 @@ class TestCephadm(object):
 
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_prometheus(self, _send_command, _get_connection, cephadm_module):
@@ -293,10 +354,307 @@ class TestCephadm(object):
             assert " on host 'test'" in out
 
     @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('{}'))
-    @mock.patch("cephadm.module.CephadmOrchestrator.send_command")
+    @mock.patch("cephadm.module.CephadmOrchestrator.send_command", side_effect=send_command)
     @mock.patch("cephadm.module.CephadmOrchestrator.mon_command", mon_command)
     @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
     def test_blink_device_light(self, _send_command, _get_connection, cephadm_module):
         with self._with_host(cephadm_module, 'test'):
             c = cephadm_module.blink_device_light('ident', True, [('test', '', '')])
             assert wait(cephadm_module, c) == ['Set ident light for test: on']
+
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
+    @mock.patch("cephadm.module.CephadmOrchestrator.set_health_checks")
+    def test_check_hosts(self, _set_health_checks, cephadm_module):
+        with self._with_host(cephadm_module, 'host1'):
+            with self._with_host(cephadm_module, 'host2'):
+                def check_host(_, host, *args, **kwargs):
+                    if host == 'host2':
+                        return [], ['oops'], 1
+                    return [], [], 0
+                with mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", check_host):
+                    cephadm_module._check_hosts()
+                hc = cephadm_module.health_checks['CEPHADM_HOST_CHECK_FAILED']
+                assert hc['detail'] == ["host host2 failed check: ['oops']"]
+
+    @mock.patch("cephadm.module.CephadmOrchestrator.set_health_checks")
+    def test_publish_health_checks(self, _set_health_checks, cephadm_module):
+        cephadm_module._publish_health_checks()
+        cephadm_module._publish_health_checks()
+        assert _set_health_checks.call_count == 1
+        cephadm_module.health_checks['CEPHADM_STRAY_HOST'] = {'summary': 'foo'}
+        cephadm_module._publish_health_checks()
+        assert _set_health_checks.call_count == 2
+
+    @mock.patch("cephadm.module.CephadmOrchestrator.list_servers")
+    def test_check_for_strays(self, _list_servers, cephadm_module):
+        _list_servers.return_value = [
+            dict(hostname='stray', services=[dict(type='mon', id='a')]),
+        ]
+        cephadm_module.warn_on_stray_hosts = False
+        cephadm_module._check_for_strays([])
+        assert 'CEPHADM_STRAY_HOST' not in cephadm_module.health_checks
+        assert cephadm_module.health_checks['CEPHADM_STRAY_DAEMON']['count'] == 1
+
+        cephadm_module.warn_on_stray_daemons = False
+        cephadm_module._check_for_strays([])
+        assert 'CEPHADM_STRAY_DAEMON' not in cephadm_module.health_checks
+        _list_servers.assert_called_once()
+
+    @mock.patch("cephadm.module.remoto.Connection")
+    def test_connection_lru(self, _connection, cephadm_module):
+        cephadm_module.ssh_connection_pool_size = 2
+        for host in ['a', 'b', 'a', 'c']:
+            cephadm_module._get_connection(host)
+        assert list(cephadm_module._cons.keys()) == ['a', 'c']
+
+    @mock.patch("cephadm.module.remoto.Connection")
+    def test_connection_lru_skips_busy(self, _connection, cephadm_module):
+        cephadm_module.ssh_connection_pool_size = 1
+        cephadm_module._get_connection('a')
+        # a call to 'a' is running in another thread
+        busy = threading.Thread(target=cephadm_module._con_lock('a').acquire)
+        busy.start()
+        busy.join()
+        cephadm_module._get_connection('b')
+        assert list(cephadm_module._cons.keys()) == ['a', 'b']
+        cephadm_module._con_locks['a'] = threading.RLock()
+        cephadm_module._get_connection('c')
+        assert list(cephadm_module._cons.keys()) == ['c']
+
+    @mock.patch("cephadm.module.remoto.Connection")
+    def test_connection_race(self, _connection, cephadm_module):
+        winner = mock.Mock(), mock.Mock()
+
+        def _import_module(remotes):
+            # another thread connects to the same host meanwhile
+            cephadm_module._cons['a'] = winner
+            return mock.Mock()
+        loser = _connection.return_value
+        loser.import_module.side_effect = _import_module
+        assert cephadm_module._get_connection('a') == winner
+        loser.exit.assert_called_once()
+        winner[0].exit.assert_not_called()
+
+    def test_ssh_control_master(self, cephadm_module):
+        assert 'ControlPath=%s/%%C' % cephadm_module._ssh_dir \
+            in cephadm_module._ssh_options
+        cephadm_module.ssh_control_persist = 0
+        cephadm_module._reconfig_ssh()
+        assert 'ControlMaster' not in (cephadm_module._ssh_options or '')
+
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
+    def test_wait_for_completion(self, cephadm_module):
+        with self._with_host(cephadm_module, 'test'):
+            c = cephadm_module.list_daemons(refresh=True)
+            cephadm_module._wait_for_completion(c, timeout=30)
+            assert c.has_result
+            assert c.result == []
+
+    def test_container_image_cache(self, cephadm_module):
+        with mock.patch("cephadm.module.CephadmOrchestrator.mon_command",
+                        return_value=(0, 'image\n', '')) as _mon_command:
+            assert cephadm_module._get_container_image('mon.a') == 'image'
+            assert cephadm_module._get_container_image('mon.a') == 'image'
+            _mon_command.assert_called_once()
+            cephadm_module.config_notify()
+            cephadm_module._get_container_image('mon.a')
+            assert _mon_command.call_count == 2
+            # deploying always looks it up
+            cephadm_module._get_container_image('mon.a', refresh=True)
+            assert _mon_command.call_count == 3
+
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
+    def test_save_inventory(self, cephadm_module):
+        with self._with_host(cephadm_module, 'test'):
+            # stored before the command returns
+            assert 'test' in json.loads(cephadm_module.get_store('inventory'))
+            c = cephadm_module.add_host_label('test', 'foo')
+            wait(cephadm_module, c)
+            inventory = json.loads(cephadm_module.get_store('inventory'))
+            assert inventory['test']['labels'] == ['foo']
+        assert 'test' not in json.loads(cephadm_module.get_store('inventory'))
+
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm(
+        json.dumps([
+            dict(
+                name='mon.a',
+                style='cephadm',
+                fsid='fsid',
+                state='running',
+            )
+        ])
+    ))
+    def test_refresh_unchanged_daemons(self, cephadm_module):
+        with self._with_host(cephadm_module, 'test'):
+            wait(cephadm_module, cephadm_module.list_daemons(refresh=True))
+            digest, data = cephadm_module._daemon_ls['test']
+            with mock.patch("cephadm.module.json.loads", wraps=json.loads) as _loads:
+                c = cephadm_module.list_daemons(refresh=True)
+                [d] = wait(cephadm_module, c)
+                assert not [c for c in _loads.call_args_list
+                            if c[0][0].startswith('[{"name": "mon.a"')]
+            assert d.name() == 'mon.a'
+            assert cephadm_module._daemon_ls['test'][0] == digest
+        assert 'test' not in cephadm_module._daemon_ls
+
+    def test_ssh_files_reused(self, cephadm_module):
+        options = cephadm_module._ssh_options
+        files = sorted(os.listdir(cephadm_module._ssh_dir))
+        cephadm_module._reconfig_ssh()
+        assert cephadm_module._ssh_options == options
+        assert sorted(os.listdir(cephadm_module._ssh_dir)) == files
+
+        cephadm_module._store['ssh_config'] = 'Host *\nUser root\n'
+        cephadm_module._reconfig_ssh()
+        assert cephadm_module._ssh_options != options
+        assert len(os.listdir(cephadm_module._ssh_dir)) == len(files)
+
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
+    @mock.patch("cephadm.module.remoto.Connection")
+    @mock.patch("cephadm.module.CephadmOrchestrator._close_ssh_master")
+    def test_update_host_addr_resets_connection(self, _close_ssh_master, _connection,
+                                                cephadm_module):
+        with self._with_host(cephadm_module, 'test'):
+            wait(cephadm_module, cephadm_module.update_host_addr('test', '1.2.3.4'))
+            cephadm_module._get_connection(cephadm_module._host_addr('test'))
+            assert list(cephadm_module._cons.keys()) == ['1.2.3.4']
+            wait(cephadm_module, cephadm_module.update_host_addr('test', '1.2.3.5'))
+            assert list(cephadm_module._cons.keys()) == []
+            _close_ssh_master.assert_called_with('1.2.3.4')
+
+    @mock.patch("cephadm.module.remoto.process.extend_env")
+    @mock.patch("cephadm.module.remoto.process.check")
+    @mock.patch("cephadm.module.CephadmOrchestrator._get_connection")
+    def test_push_cephadm(self, _get_connection, _check, _extend_env, cephadm_module):
+        conn, connr = mock.MagicMock(), mock.MagicMock()
+        connr.choose_python.return_value = '/usr/bin/python3'
+        _get_connection.return_value = conn, connr
+        path = cephadm_module._cephadm_remote_path()
+        assert path.startswith('/var/lib/cephadm/cephadm-')
+
+        _check.return_value = (['ok'], [], 0)
+        cephadm_module._run_cephadm('test', 'mon', 'ls', [], image='image')
+        cephadm_module._run_cephadm('test', 'mon', 'ls', [], image='image')
+        connr.write_file.assert_called_once()
+        connr.remove_other_files.assert_called_once_with(
+            '/var/lib/cephadm', 'cephadm-', os.path.basename(path))
+
+        # removed on the host, e.g. by rm-cluster: pushed again
+        _check.side_effect = [
+            ([], ["python3: can't open file '%s': [Errno 2] No such file or directory" % path], 2),
+            (['ok'], [], 0),
+        ]
+        out, err, code = cephadm_module._run_cephadm('test', 'mon', 'ls', [], image='image')
+        assert (out, code) == (['ok'], 0)
+        assert connr.write_file.call_count == 2
+
+    @mock.patch("cephadm.module.remoto.process.extend_env")
+    def test_remote_env_cached(self, _extend_env, cephadm_module):
+        _extend_env.return_value = {'env': {'PATH': '/bin'}}
+        conn = mock.MagicMock()
+        assert cephadm_module._get_remote_env('1.2.3.4', conn) == {'PATH': '/bin'}
+        assert cephadm_module._get_remote_env('1.2.3.4', conn) == {'PATH': '/bin'}
+        assert _extend_env.call_count == 1
+        cephadm_module._reset_con('1.2.3.4')
+        cephadm_module._get_remote_env('1.2.3.4', conn)
+        assert _extend_env.call_count == 2
+
+    def test_prometheus_config_cache(self, cephadm_module):
+        mgr_map = {'services': {'prometheus': 'http://1.2.3.4:9283/'}}
+        with mock.patch("cephadm.module.CephadmOrchestrator.get",
+                        return_value=mgr_map):
+            j = cephadm_module._generate_prometheus_config()
+            assert "['1.2.3.4:9283']" in j
+            assert cephadm_module._generate_prometheus_config() is j
+            mgr_map['services']['prometheus'] = 'http://1.2.3.5:9283/'
+            assert "['1.2.3.5:9283']" in cephadm_module._generate_prometheus_config()
+
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm")
+    def test_image_id_cache(self, _run_cephadm, cephadm_module):
+        _run_cephadm.return_value = ('{"image_id": "id", "ceph_version": "v"}', '', 0)
+        with self._with_host(cephadm_module, 'test'):
+            _run_cephadm.reset_mock()
+            assert cephadm_module._get_container_image_id('image') == ('id', 'v')
+            assert cephadm_module._get_container_image_id('image') == ('id', 'v')
+            _run_cephadm.assert_called_once()
+
+    def test_osd_uuid_map_cache(self, cephadm_module):
+        osd_map = {'epoch': 3, 'osds': [{'osd': 0, 'uuid': 'uuid0'}]}
+        with mock.patch("cephadm.module.CephadmOrchestrator.get",
+                        return_value=osd_map) as _get, \
+                mock.patch("cephadm.module.CephadmOrchestrator.get_osdmap") as _get_osdmap:
+            _get_osdmap.return_value.get_epoch.return_value = 3
+            assert cephadm_module.get_osd_uuid_map() == {'0': 'uuid0'}
+            assert cephadm_module.get_osd_uuid_map() == {'0': 'uuid0'}
+            assert _get.call_count == 1
+
+            osd_map['epoch'] = 4
+            osd_map['osds'].append({'osd': 1, 'uuid': 'uuid1'})
+            _get_osdmap.return_value.get_epoch.return_value = 4
+            assert cephadm_module.get_osd_uuid_map() == {'0': 'uuid0', '1': 'uuid1'}
+
+    def test_crash_keyring_cache(self, cephadm_module):
+        sent = []
+
+        def _send_command(result, svc_type, svc_id, command, tag):
+            sent.append(json.loads(command)['prefix'])
+            result.complete(0, 'out', '')
+
+        with mock.patch("cephadm.module.CephadmOrchestrator.send_command",
+                        side_effect=_send_command):
+            cephadm_module._generate_config_and_keyrings('mds', 'a', 'test', 'keyring')
+            cephadm_module._generate_config_and_keyrings('mds', 'b', 'test', 'keyring')
+        assert sent.count('auth get-or-create') == 1
+
+    def test_upgrade_state(self, cephadm_module):
+        assert wait(cephadm_module, cephadm_module.upgrade_start('img', None)) == \
+            'Initiating upgrade to img'
+        assert wait(cephadm_module, cephadm_module.upgrade_pause()) == \
+            'Paused upgrade to img'
+        assert wait(cephadm_module, cephadm_module.upgrade_pause()) == \
+            'Upgrade to img already paused'
+        assert wait(cephadm_module, cephadm_module.upgrade_resume()) == \
+            'Resumed upgrade to img'
+        assert wait(cephadm_module, cephadm_module.upgrade_resume()) == \
+            'Upgrade to img not paused'
+        assert wait(cephadm_module, cephadm_module.upgrade_stop()) == \
+            'Stopped upgrade to img'
+        assert cephadm_module.upgrade_state is None
+
+    def test_mon_commands(self, cephadm_module):
+        sent = []
+
+        def _send_command(result, svc_type, svc_id, command, tag):
+            sent.append(json.loads(command)['prefix'])
+            # only complete once everything has been sent
+            if len(sent) == 2:
+                for r in pending + [result]:
+                    r.complete(0, 'out', '')
+            else:
+                pending.append(result)
+        pending = []
+
+        with mock.patch("cephadm.module.CephadmOrchestrator.send_command",
+                        side_effect=_send_command):
+            r = cephadm_module._mon_commands([{'prefix': 'a'}, {'prefix': 'b'}])
+        assert sent == ['a', 'b']
+        assert r == [(0, 'out', ''), (0, 'out', '')]
+
+    def test_minimal_conf_cache(self, cephadm_module):
+        assert cephadm_module._get_cached_minimal_conf() is None
+        cephadm_module._cache_minimal_conf('conf')
+        assert cephadm_module._get_cached_minimal_conf() == 'conf'
+        cephadm_module.notify('mon_map', None)
+        assert cephadm_module._get_cached_minimal_conf() is None
+
+    @mock.patch("cephadm.module.CephadmOrchestrator._run_cephadm", _run_cephadm('[]'))
+    def test_update_daemon_cache(self, cephadm_module):
+        with self._with_host(cephadm_module, 'test'):
+            cephadm_module._update_daemon_cache('test', add={'name': 'mon.a'})
+            cephadm_module._update_daemon_cache('test', add={'name': 'mon.b'})
+            cephadm_module._update_daemon_cache('test', remove='mon.a')
+            assert not cephadm_module.daemon_cache['test'].data
+            cephadm_module._flush_daemon_cache()
+            entry = cephadm_module.daemon_cache['test']
+            assert entry.data == [{'name': 'mon.b'}]
+            assert entry.outdated()
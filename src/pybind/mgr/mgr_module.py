@@ -273,6 +273,8 @@ class CLICommand(object):
         self.prefix = prefix
         self.args = args
         self.args_dict = {}
+        # (arg name, kwarg name, optional) per argument, for call()
+        self._call_args = []  # type: List[Tuple[str, str, bool]]
         self.desc = desc
         self.perm = perm
         self.func = None  # type: Optional[Callable]
@@ -291,6 +293,8 @@ class CLICommand(object):
                     arg_d[k] = v
                 else:
                     self.args_dict[v] = arg_d
+        self._call_args = [(a, a.replace("-", "_"), d.get('req') == "false")
+                           for a, d in self.args_dict.items()]
 
     def __call__(self, func):
         self.func = func
@@ -299,10 +303,10 @@ class CLICommand(object):
 
     def call(self, mgr, cmd_dict, inbuf):
         kwargs = {}
-        for a, d in self.args_dict.items():
-            if 'req' in d and d['req'] == "false" and a not in cmd_dict:
+        for a, kwarg, optional in self._call_args:
+            if optional and a not in cmd_dict:
                 continue
-            kwargs[a.replace("-", "_")] = cmd_dict[a]
+            kwargs[kwarg] = cmd_dict[a]
         if inbuf:
             kwargs['inbuf'] = inbuf
         assert self.func
@@ -37,6 +37,8 @@ logger = logging.getLogger(__name__)
 
 
 class HostPlacementSpec(namedtuple('HostPlacementSpec', ['hostname', 'network', 'name'])):
+    __slots__ = ()
+
     def __str__(self):
         res = ''
         res += self.hostname
@@ -408,7 +410,10 @@ class _Promise(object):
 
     def _last_promise(self):
         # type: () -> _Promise
-        return list(iter(self))[-1]
+        last = self
+        while last._next_promise is not None:
+            last = last._next_promise
+        return last
 
 
 class ProgressReference(object):
@@ -609,11 +614,13 @@ class Completion(_Promise):
 
     def result_str(self):
         """Force a string."""
-        if self.result is None:
+        # `result` walks the whole promise chain, look it up once
+        result = self.result
+        if result is None:
             return ''
-        if isinstance(self.result, list):
-            return '\n'.join(str(x) for x in self.result)
-        return str(self.result)
+        if isinstance(result, list):
+            return '\n'.join(str(x) for x in result)
+        return str(result)
 
     @property
     def exception(self):
@@ -1102,6 +1109,8 @@ class HostSpec(object):
 
 class UpgradeStatusSpec(object):
     # Orchestrator's report on what's going on with any ongoing upgrade
+    __slots__ = ('in_progress', 'target_image', 'services_complete', 'message')
+
     def __init__(self):
         self.in_progress = False  # Is an upgrade underway?
         self.target_image = None
@@ -1653,12 +1662,17 @@ class OrchestratorClientMixin(Orchestrator):
         :raises RuntimeError: something went wrong while calling the process method.
         :raises ImportError: no `orchestrator` module or backend not found.
         """
+        # Back off from a short poll interval: operations that finish
+        # quickly return within milliseconds rather than a full second,
+        # long running ones are still polled once a second.
+        delay = 0.01
         while any(not c.has_result for c in completions):
             self.process(completions)
             self.__get_mgr().log.info("Operations pending: %s",
                                       sum(1 for c in completions if not c.has_result))
             if any(c.needs_result for c in completions):
-                time.sleep(1)
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
             else:
                 break
 
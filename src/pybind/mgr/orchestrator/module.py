@@ -1,17 +1,18 @@
 import datetime
 import errno
+import itertools
 import json
-import yaml
+import operator
+import time
 
 import six
 
 from ceph.deployment.inventory import Device
-from prettytable import PrettyTable
 
 from mgr_util import format_bytes, to_pretty_timedelta
 
 try:
-    from typing import List, Set, Optional, Dict
+    from typing import List, Set, Optional, Dict, Callable, Any, Sequence
 except ImportError:
     pass  # just for type checking.
 
@@ -26,6 +27,53 @@ from ._interface import OrchestratorClientMixin, DeviceLightLoc, _cli_read_comma
     RGWSpec, InventoryFilter, InventoryNode, HostPlacementSpec, HostSpec, CLICommandMeta
 
 
+# cmd_args shared by the commands that take a service placement
+_PLACEMENT_ARGS = ('name=num,type=CephInt,req=false '
+                   'name=hosts,type=CephString,n=N,req=false '
+                   'name=label,type=CephString,req=false')
+
+_UPGRADE_STATUS_FIELDS = ('target_image', 'in_progress', 'services_complete', 'message')
+_get_upgrade_status_fields = operator.attrgetter(*_UPGRADE_STATUS_FIELDS)
+
+_DAEMON_STATUS = {
+    -1: 'error',
+    0: 'stopped',
+    1: 'running',
+    None: '<unknown>'
+}
+
+
+def _load_yaml(inbuf):
+    # yaml is only needed by `orch osd create -i`, keep it out of the
+    # module import
+    import yaml
+    try:
+        # libyaml based, if pyyaml was built with it
+        from yaml import CSafeLoader as YamlLoader
+    except ImportError:
+        from yaml import SafeLoader as YamlLoader  # type: ignore
+    return yaml.load(inbuf, Loader=YamlLoader)
+
+
+def _render_table(headers, rows, right_aligned=()):
+    # type: (List[str], Sequence[Sequence[Any]], tuple) -> str
+    """
+    Render rows as a borderless table: every column padded to its widest
+    cell plus one space, left aligned unless its header is listed in
+    `right_aligned`.  This is the layout the CLI used to get from
+    PrettyTable, in two passes over the rows.  Like PrettyTable, an empty
+    table renders as ''.
+    """
+    if not rows:
+        return ''
+    lines = [headers] + [[str(c) for c in row] for row in rows]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(headers))]
+    just = [str.rjust if h in right_aligned else str.ljust for h in headers]
+    return '\n'.join(
+        ''.join(j(c, w) + ' ' for c, w, j in zip(line, widths, just))
+        for line in lines)
+
+
 @six.add_metaclass(CLICommandMeta)
 class OrchestratorCli(OrchestratorClientMixin, MgrModule):
     MODULE_OPTIONS = [
@@ -38,53 +86,109 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
                              'test_orchestrator'],
             'runtime': True,
         },
+        {
+            'name': 'status_cache_ttl',
+            'type': 'secs',
+            'default': 0,
+            'desc': 'seconds to reuse `orch status`, `upgrade status` and '
+                    '`upgrade check` results for (0 disables caching)',
+            'runtime': True,
+        },
     ]
     NATIVE_OPTIONS = []  # type: List[dict]
 
     def __init__(self, *args, **kwargs):
         super(OrchestratorCli, self).__init__(*args, **kwargs)
-        self.ident = set()  # type: Set[str]
-        self.fault = set()  # type: Set[str]
+        # mirrors of MODULE_OPTIONS, kept current by config_notify()
+        self.orchestrator = None  # type: Optional[str]
+        self.status_cache_ttl = 0
+        self.config_notify()
+        # light type ('ident' or 'fault') -> devids with that light on
+        self._lights = {
+            'ident': set(),
+            'fault': set(),
+        }  # type: Dict[str, Set[str]]
+        # health check name -> (devices it was rendered for, check)
+        self._health_cache = {}  # type: Dict[str, tuple]
+        # (ident, fault) as last written to the store
+        self._saved = None  # type: Optional[tuple]
+        # (command, args) -> (backend, time, result), see _cached_result()
+        self._result_cache = {}  # type: Dict[tuple, tuple]
         self._load()
         self._refresh_health()
 
+    @property
+    def ident(self):
+        # type: () -> Set[str]
+        return self._lights['ident']
+
+    @property
+    def fault(self):
+        # type: () -> Set[str]
+        return self._lights['fault']
+
     def _load(self):
         active = self.get_store('active_devices')
         if active:
             decoded = json.loads(active)
-            self.ident = set(decoded.get('ident', []))
-            self.fault = set(decoded.get('fault', []))
-        self.log.debug('ident {}, fault {}'.format(self.ident, self.fault))
+            self._lights['ident'] = set(decoded.get('ident', []))
+            self._lights['fault'] = set(decoded.get('fault', []))
+            self._saved = (frozenset(self.ident), frozenset(self.fault))
+        self.log.debug('ident %s, fault %s', self.ident, self.fault)
 
     def _save(self):
+        # type: () -> bool
+        state = (frozenset(self.ident), frozenset(self.fault))
+        if state == self._saved:
+            return False
         encoded = json.dumps({
-            'ident': list(self.ident),
-            'fault': list(self.fault),
-            })
+            'ident': sorted(self.ident),
+            'fault': sorted(self.fault),
+            }, separators=(',', ':'))
         self.set_store('active_devices', encoded)
+        self._saved = state
+        return True
+
+    def _commit(self):
+        """
+        Store the active lights and refresh their health checks, if they
+        changed since the last commit.
+        """
+        if self._save():
+            self._refresh_health()
+
+    def _light_health_check(self, name, light_type, devids):
+        # type: (str, str, Set[str]) -> dict
+        cached = self._health_cache.get(name)
+        if cached is not None and cached[0] == devids:
+            return cached[1]
+        check = {
+            'severity': 'warning',
+            'summary': f'{len(devids)} devices have {light_type} light turned on',
+            'detail': [f'{d} {light_type} light enabled' for d in devids]
+        }
+        self._health_cache[name] = (frozenset(devids), check)
+        return check
 
     def _refresh_health(self):
         h = {}
         if self.ident:
-            h['DEVICE_IDENT_ON'] = {
-                'severity': 'warning',
-                'summary': '%d devices have ident light turned on' % len(
-                    self.ident),
-                'detail': ['{} ident light enabled'.format(d) for d in self.ident]
-            }
+            h['DEVICE_IDENT_ON'] = self._light_health_check(
+                'DEVICE_IDENT_ON', 'ident', self.ident)
         if self.fault:
-            h['DEVICE_FAULT_ON'] = {
-                'severity': 'warning',
-                'summary': '%d devices have fault light turned on' % len(
-                    self.fault),
-                'detail': ['{} fault light enabled'.format(d) for d in self.ident]
-            }
+            h['DEVICE_FAULT_ON'] = self._light_health_check(
+                'DEVICE_FAULT_ON', 'fault', self.fault)
         self.set_health_checks(h)
 
     def _get_device_locations(self, dev_id):
-        # type: (str) -> List[DeviceLightLoc]
+        # type: (str) -> Optional[List[DeviceLightLoc]]
+        """
+        Locations of a device, or None if the cluster does not know it.
+        """
         locs = [d['location'] for d in self.get('devices')['devices'] if d['devid'] == dev_id]
-        return [DeviceLightLoc(**l) for l in sum(locs, [])]
+        if not locs:
+            return None
+        return [DeviceLightLoc(**l) for l in itertools.chain.from_iterable(locs)]
 
     @_cli_read_command(
         prefix='device ls-lights',
@@ -98,35 +202,38 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
 
     def light_on(self, fault_ident, devid):
         # type: (str, str) -> HandleCommandResult
-        assert fault_ident in ("fault", "ident")
+        assert fault_ident in self._lights
         locs = self._get_device_locations(devid)
         if locs is None:
-            return HandleCommandResult(stderr='device {} not found'.format(devid),
+            return HandleCommandResult(stderr=f'device {devid} not found',
                                        retval=-errno.ENOENT)
 
-        getattr(self, fault_ident).add(devid)
-        self._save()
-        self._refresh_health()
+        self._lights[fault_ident].add(devid)
+        self._commit()
         completion = self.blink_device_light(fault_ident, True, locs)
         self._orchestrator_wait([completion])
         return HandleCommandResult(stdout=str(completion.result))
 
     def light_off(self, fault_ident, devid, force):
         # type: (str, str, bool) -> HandleCommandResult
-        assert fault_ident in ("fault", "ident")
+        assert fault_ident in self._lights
+        lights = self._lights[fault_ident]
         locs = self._get_device_locations(devid)
         if locs is None:
-            return HandleCommandResult(stderr='device {} not found'.format(devid),
+            if force and devid in lights:
+                # the device is gone; just forget its light
+                lights.remove(devid)
+                self._commit()
+            return HandleCommandResult(stderr=f'device {devid} not found',
                                        retval=-errno.ENOENT)
 
         try:
             completion = self.blink_device_light(fault_ident, False, locs)
             self._orchestrator_wait([completion])
 
-            if devid in getattr(self, fault_ident):
-                getattr(self, fault_ident).remove(devid)
-                self._save()
-                self._refresh_health()
+            if devid in lights:
+                lights.remove(devid)
+                self._commit()
             return HandleCommandResult(stdout=str(completion.result))
 
         except:
@@ -134,10 +241,9 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
             # 1. the device no longer exist
             # 2. the device is no longer known to Ceph
             # 3. the host is not reachable
-            if force and devid in getattr(self, fault_ident):
-                getattr(self, fault_ident).remove(devid)
-                self._save()
-                self._refresh_health()
+            if force and devid in lights:
+                lights.remove(devid)
+                self._commit()
             raise
 
     @_cli_write_command(
@@ -157,8 +263,42 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
         else:
             return self.light_off(light_type, devid, force)
 
+    def config_notify(self):
+        """
+        This method is called whenever one of our config options is changed.
+        """
+        for opt in self.MODULE_OPTIONS:
+            setattr(self, opt['name'], self.get_module_option(opt['name']))
+
     def _select_orchestrator(self):
-        return self.get_module_option("orchestrator")
+        return self.orchestrator
+
+    def _cached_result(self, key):
+        # type: (tuple) -> Optional[HandleCommandResult]
+        """
+        The result stored for `key` by _cache_result(), if it is less than
+        status_cache_ttl seconds old and the backend has not changed since.
+        """
+        if not self.status_cache_ttl or key not in self._result_cache:
+            return None
+        backend, fetched, result = self._result_cache[key]
+        if backend != self.orchestrator or \
+                time.monotonic() - fetched >= self.status_cache_ttl:
+            return None
+        return result
+
+    def _cache_result(self, key, result):
+        # type: (tuple, HandleCommandResult) -> HandleCommandResult
+        if self.status_cache_ttl:
+            # stamped once the result is in, so a slow backend does not
+            # eat into the window
+            now = time.monotonic()
+            self._result_cache = {
+                k: v for k, v in self._result_cache.items()
+                if now - v[1] < self.status_cache_ttl
+            }
+            self._result_cache[key] = (self.orchestrator, now, result)
+        return result
 
     @_cli_write_command(
         'orch host add',
@@ -207,15 +347,10 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
                      for node in completion.result]
             output = json.dumps(hosts, sort_keys=True)
         else:
-            table = PrettyTable(
+            output = _render_table(
                 ['HOST', 'ADDR', 'LABELS'],
-                border=False)
-            table.align = 'l'
-            table.left_padding_width = 0
-            table.right_padding_width = 1
-            for node in completion.result:
-                table.add_row((node.name, node.addr, ' '.join(node.labels)))
-            output = table.get_string()
+                [(node.name, node.addr, ' '.join(node.labels))
+                 for node in completion.result])
         return HandleCommandResult(stdout=output)
 
     @_cli_write_command(
@@ -264,21 +399,12 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
 
         if format == 'json':
             data = [n.to_json() for n in completion.result]
-            return HandleCommandResult(stdout=json.dumps(data))
+            return HandleCommandResult(stdout=json.dumps(data, separators=(',', ':')))
         else:
-            out = []
-
-            table = PrettyTable(
-                ['HOST', 'PATH', 'TYPE', 'SIZE', 'DEVICE', 'AVAIL',
-                 'REJECT REASONS'],
-                border=False)
-            table.align = 'l'
-            table._align['SIZE'] = 'r'
-            table.left_padding_width = 0
-            table.right_padding_width = 1
+            rows = []
             for host_ in completion.result: # type: InventoryNode
                 for d in host_.devices.devices:  # type: Device
-                    table.add_row(
+                    rows.append(
                         (
                             host_.name,
                             d.path,
@@ -289,8 +415,11 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
                             ', '.join(d.rejected_reasons)
                         )
                     )
-            out.append(table.get_string())
-            return HandleCommandResult(stdout='\n'.join(out))
+            return HandleCommandResult(stdout=_render_table(
+                ['HOST', 'PATH', 'TYPE', 'SIZE', 'DEVICE', 'AVAIL',
+                 'REJECT REASONS'],
+                rows,
+                right_aligned=('SIZE',)))
 
     @_cli_read_command(
         'orch ps',
@@ -311,46 +440,37 @@ class OrchestratorCli(OrchestratorClientMixin, MgrModule):
 
         def ukn(s):
             return '<unknown>' if s is None else s
-        # Sort the list for display
-        daemons.sort(key=lambda s: (ukn(s.daemon_type), ukn(s.nodename), ukn(s.daemon_id)))
 
         if len(daemons) == 0:
             return HandleCommandResult(stdout="No daemons reported")
         elif format == 'json':
+            daemons.sort(key=lambda s: (ukn(s.daemon_type), ukn(s.nodename), ukn(s.daemon_id)))
             data = [s.to_json() for s in daemons]
-            return HandleCommandResult(stdout=json.dumps(data))
+            return HandleCommandResult(stdout=json.dumps(data, separators=(',', ':')))
         else:
+            # Sort the list for display
+            daemons.sort(key=lambda s: s.name())
             now = datetime.datetime.utcnow()
-            table = PrettyTable(
-                ['NAME', 'HOST', 'STATUS', 'REFRESHED',
-                 'VERSION', 'IMAGE NAME', 'IMAGE ID', 'CONTAINER ID'],
-                border=False)
-            table.align = 'l'
-            table.left_padding_width = 0
-            table.right_padding_width = 1
-            for s in sorted(daemons, key=lambda s: s.name()):
-                status = {
-                    -1: 'error',
-                    0: 'stopped',
-                    1: 'running',
-                    None: '<unknown>'
-                }[s.status]
-
+            rows = []
+            for s in daemons:
                 if s.last_refresh:
                     age = to_pretty_timedelta(now - s.last_refresh) + ' ago'
                 else:
                     age = '-'
-                table.add_row((
+                rows.append((
                     s.name(),
                     ukn(s.nodename),
-                    status,
+                    _DAEMON_STATUS[s.status],
                     age,
                     ukn(s.version),
                     ukn(s.container_image_name),
                     ukn(s.container_image_id)[0:12],
                     ukn(s.container_id)[0:12]))
 
-            return HandleCommandResult(stdout=table.get_string())
+            return HandleCommandResult(stdout=_render_table(
+                ['NAME', 'HOST', 'STATUS', 'REFRESHED',
+                 'VERSION', 'IMAGE NAME', 'IMAGE ID', 'CONTAINER ID'],
+                rows))
 
     @_cli_write_command(
         'orch osd create',
@@ -368,10 +488,10 @@ Usage:
 
         if inbuf:
             try:
-                dgs = DriveGroupSpecs(yaml.load(inbuf))
+                dgs = DriveGroupSpecs(_load_yaml(inbuf))
                 drive_groups = dgs.drive_groups
             except ValueError as e:
-                msg = 'Failed to read JSON input: {}'.format(str(e)) + usage
+                msg = f'Failed to read JSON input: {e}' + usage
                 return HandleCommandResult(-errno.EINVAL, stderr=msg)
 
         elif svc_arg:
@@ -379,7 +499,7 @@ Usage:
                 node_name, block_device = svc_arg.split(":")
                 block_devices = block_device.split(',')
             except (TypeError, KeyError, ValueError):
-                msg = "Invalid host:device spec: '{}'".format(svc_arg) + usage
+                msg = f"Invalid host:device spec: '{svc_arg}'" + usage
                 return HandleCommandResult(-errno.EINVAL, stderr=msg)
 
             devs = DeviceSelection(paths=block_devices)
@@ -394,9 +514,7 @@ Usage:
 
     @_cli_write_command(
         'orch daemon add mon',
-        "name=num,type=CephInt,req=false "
-        "name=hosts,type=CephString,n=N,req=false "
-        "name=label,type=CephString,req=false",
+        _PLACEMENT_ARGS,
         'Start monitor daemon(s)')
     def _daemon_add_mon(self, num=None, hosts=[], label=None):
         if not num and not hosts and not label:
@@ -471,7 +589,7 @@ Usage:
             try:
                 rgw_spec = RGWSpec.from_json(json.loads(inbuf))
             except ValueError as e:
-                msg = 'Failed to read JSON input: {}'.format(str(e)) + usage
+                msg = f'Failed to read JSON input: {e}' + usage
                 return HandleCommandResult(-errno.EINVAL, stderr=msg)
         rgw_spec = RGWSpec(
             rgw_realm=realm_name,
@@ -487,10 +605,8 @@ Usage:
         'orch daemon add nfs',
         "name=svc_arg,type=CephString "
         "name=pool,type=CephString "
-        "name=namespace,type=CephString,req=false "
-        'name=num,type=CephInt,req=false '
-        'name=hosts,type=CephString,n=N,req=false '
-        'name=label,type=CephString,req=false',
+        "name=namespace,type=CephString,req=false " +
+        _PLACEMENT_ARGS,
         'Start NFS daemon(s)')
     def _nfs_add(self, svc_arg, pool, namespace=None, num=None, label=None, hosts=[]):
         spec = NFSServiceSpec(
@@ -507,9 +623,7 @@ Usage:
 
     @_cli_write_command(
         'orch daemon add prometheus',
-        'name=num,type=CephInt,req=false '
-        'name=hosts,type=CephString,n=N,req=false '
-        'name=label,type=CephString,req=false',
+        _PLACEMENT_ARGS,
         'Add prometheus daemon(s)')
     def _daemon_add_prometheus(self, num=None, label=None, hosts=[]):
         # type: (Optional[int], Optional[str], List[str]) -> HandleCommandResult
@@ -526,11 +640,7 @@ Usage:
         "name=svc_name,type=CephString",
         'Start, stop, restart, redeploy, or reconfig an entire service (i.e. all daemons)')
     def _service_action(self, action, svc_name):
-        if '.' in svc_name:
-            (service_type, service_id) = svc_name.split('.', 1)
-        else:
-            service_type = svc_name;
-            service_id = None
+        service_type, _, service_id = svc_name.partition('.')
         completion = self.service_action(action, service_type, service_id)
         self._orchestrator_wait([completion])
         raise_if_exception(completion)
@@ -542,9 +652,9 @@ Usage:
         "name=name,type=CephString",
         'Start, stop, restart, redeploy, or reconfig a specific daemon')
     def _daemon_action(self, action, name):
-        if '.' not in name:
-            raise OrchestratorError('%s is not a valid daemon name' % name)
-        (daemon_type, daemon_id) = name.split('.', 1)
+        daemon_type, dot, daemon_id = name.partition('.')
+        if not dot:
+            raise OrchestratorError(f'{name} is not a valid daemon name')
         completion = self.daemon_action(action, daemon_type, daemon_id)
         self._orchestrator_wait([completion])
         raise_if_exception(completion)
@@ -556,9 +666,9 @@ Usage:
         'name=force,type=CephBool,req=false',
         'Remove specific daemon(s)')
     def _daemon_rm(self, names, force=False):
-        for name in names:
-            if '.' not in name:
-                raise OrchestratorError('%s is not a valid daemon name' % name)
+        bad = next((name for name in names if '.' not in name), None)
+        if bad is not None:
+            raise OrchestratorError(f'{bad} is not a valid daemon name')
         completion = self.remove_daemons(names, force)
         self._orchestrator_wait([completion])
         raise_if_exception(completion)
@@ -569,23 +679,17 @@ Usage:
         "name=name,type=CephString",
         'Remove a service')
     def _service_rm(self, name):
-        if '.' in name:
-            (service_type, service_name) = name.split('.')
-        else:
-            service_type = name;
-            service_name = None
+        service_type, _, service_name = name.partition('.')
         if name in ['mon', 'mgr']:
             raise OrchestratorError('The mon and mgr services cannot be removed')
-        completion = self.remove_service(service_type, service_name)
+        completion = self.remove_service(service_type, service_name or None)
         self._orchestrator_wait([completion])
         raise_if_exception(completion)
         return HandleCommandResult(stdout=completion.result_str())
 
     @_cli_write_command(
         'orch apply mgr',
-        "name=num,type=CephInt,req=false "
-        "name=hosts,type=CephString,n=N,req=false "
-        "name=label,type=CephString,req=false",
+        _PLACEMENT_ARGS,
         'Update the size or placement of managers')
     def _apply_mgr(self, num=None, hosts=[], label=None):
         placement = PlacementSpec(
@@ -601,9 +705,7 @@ Usage:
 
     @_cli_write_command(
         'orch apply mon',
-        "name=num,type=CephInt,req=false "
-        "name=hosts,type=CephString,n=N,req=false "
-        "name=label,type=CephString,req=false",
+        _PLACEMENT_ARGS,
         'Update the number of monitor instances')
     def _apply_mon(self, num=None, hosts=[], label=None):
         if not num and not hosts and not label:
@@ -621,10 +723,8 @@ Usage:
 
     @_cli_write_command(
         'orch apply mds',
-        "name=fs_name,type=CephString "
-        "name=num,type=CephInt,req=false "
-        "name=hosts,type=CephString,n=N,req=false "
-        "name=label,type=CephString,req=false",
+        "name=fs_name,type=CephString " +
+        _PLACEMENT_ARGS,
         'Update the number of MDS instances for the given fs_name')
     def _apply_mds(self, fs_name, num=None, label=None, hosts=[]):
         placement = PlacementSpec(label=label, count=num, hosts=hosts)
@@ -641,9 +741,7 @@ Usage:
 
     @_cli_write_command(
         'orch apply rbd-mirror',
-        "name=num,type=CephInt,req=false "
-        "name=hosts,type=CephString,n=N,req=false "
-        "name=label,type=CephString,req=false",
+        _PLACEMENT_ARGS,
         'Update the number of rbd-mirror instances')
     def _apply_rbd_mirror(self, num, label=None, hosts=[]):
         spec = ServiceSpec(
@@ -656,10 +754,8 @@ Usage:
     @_cli_write_command(
         'orch apply rgw',
         'name=realm_name,type=CephString '
-        'name=zone_name,type=CephString '
-        'name=num,type=CephInt,req=false '
-        'name=hosts,type=CephString,n=N,req=false '
-        'name=label,type=CephString,req=false',
+        'name=zone_name,type=CephString ' +
+        _PLACEMENT_ARGS,
         'Update the number of RGW instances for the given zone')
     def _apply_rgw(self, zone_name, realm_name, num=None, label=None, hosts=[]):
         spec = RGWSpec(
@@ -673,10 +769,8 @@ Usage:
 
     @_cli_write_command(
         'orch apply nfs',
-        "name=svc_id,type=CephString "
-        'name=num,type=CephInt,req=false '
-        'name=hosts,type=CephString,n=N,req=false '
-        'name=label,type=CephString,req=false',
+        "name=svc_id,type=CephString " +
+        _PLACEMENT_ARGS,
         'Scale an NFS service')
     def _apply_nfs(self, svc_id, num=None, label=None, hosts=[]):
         # type: (str, Optional[int], Optional[str], List[str]) -> HandleCommandResult
@@ -690,9 +784,7 @@ Usage:
 
     @_cli_write_command(
         'orch apply prometheus',
-        'name=num,type=CephInt,req=false '
-        'name=hosts,type=CephString,n=N,req=false '
-        'name=label,type=CephString,req=false',
+        _PLACEMENT_ARGS,
         'Scale prometheus service')
     def _apply_prometheus(self, num=None, label=None, hosts=[]):
         # type: (Optional[int], Optional[str], List[str]) -> HandleCommandResult
@@ -716,41 +808,39 @@ Usage:
         There isn't a mechanism for ensuring they don't *disable* the module
         later, but this is better than nothing.
         """
-        mgr_map = self.get("mgr_map")
-
         if module_name is None or module_name == "":
             self.set_module_option("orchestrator", None)
+            self.orchestrator = None
+            self._result_cache.clear()
             return HandleCommandResult()
 
-        for module in mgr_map['available_modules']:
-            if module['name'] != module_name:
-                continue
-
-            if not module['can_run']:
-                continue
-
-            enabled = module['name'] in mgr_map['modules']
-            if not enabled:
-                return HandleCommandResult(-errno.EINVAL,
-                                           stderr="Module '{module_name}' is not enabled. \n Run "
-                                                  "`ceph mgr module enable {module_name}` "
-                                                  "to enable.".format(module_name=module_name))
+        mgr_map = self.get("mgr_map")
+        module = next((m for m in mgr_map['available_modules']
+                       if m['name'] == module_name and m['can_run']), None)
+        if module is None:
+            return HandleCommandResult(-errno.EINVAL, stderr=f"Module '{module_name}' not found")
 
-            try:
-                is_orchestrator = self.remote(module_name,
-                                              "is_orchestrator_module")
-            except NameError:
-                is_orchestrator = False
+        if module_name not in mgr_map['modules']:
+            return HandleCommandResult(-errno.EINVAL,
+                                       stderr=f"Module '{module_name}' is not enabled. \n Run "
+                                              f"`ceph mgr module enable {module_name}` "
+                                              "to enable.")
 
-            if not is_orchestrator:
-                return HandleCommandResult(-errno.EINVAL,
-                                           stderr="'{0}' is not an orchestrator module".format(module_name))
+        try:
+            is_orchestrator = self.remote(module_name,
+                                          "is_orchestrator_module")
+        except NameError:
+            is_orchestrator = False
 
-            self.set_module_option("orchestrator", module_name)
+        if not is_orchestrator:
+            return HandleCommandResult(-errno.EINVAL,
+                                       stderr=f"'{module_name}' is not an orchestrator module")
 
-            return HandleCommandResult()
+        self.set_module_option("orchestrator", module_name)
+        self.orchestrator = module_name
+        self._result_cache.clear()
 
-        return HandleCommandResult(-errno.EINVAL, stderr="Module '{0}' not found".format(module_name))
+        return HandleCommandResult()
 
     @_cli_write_command(
         'orch cancel',
@@ -760,6 +850,7 @@ Usage:
         ProgressReferences might get stuck. Let's unstuck them.
         """
         self.cancel_completions()
+        self._result_cache.clear()
         return HandleCommandResult()
 
     @_cli_read_command(
@@ -770,15 +861,18 @@ Usage:
         if o is None:
             raise NoOrchestrator()
 
+        cached = self._cached_result(('status',))
+        if cached is not None:
+            return cached
+
         avail, why = self.available()
         if avail is None:
             # The module does not report its availability
-            return HandleCommandResult(stdout="Backend: {0}".format(o))
+            result = HandleCommandResult(stdout=f"Backend: {o}")
         else:
-            return HandleCommandResult(stdout="Backend: {0}\nAvailable: {1}{2}".format(
-                                           o, avail,
-                                           " ({0})".format(why) if not avail else ""
-                                       ))
+            reason = f" ({why})" if not avail else ""
+            result = HandleCommandResult(stdout=f"Backend: {o}\nAvailable: {avail}{reason}")
+        return self._cache_result(('status',), result)
 
     def self_test(self):
         old_orch = self._select_orchestrator()
@@ -809,26 +903,47 @@ Usage:
         'name=ceph_version,type=CephString,req=false',
         desc='Check service versions vs available and target containers')
     def _upgrade_check(self, image=None, ceph_version=None):
+        key = ('upgrade check', image, ceph_version)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
         completion = self.upgrade_check(image=image, version=ceph_version)
         self._orchestrator_wait([completion])
         raise_if_exception(completion)
-        return HandleCommandResult(stdout=completion.result_str())
+        return self._cache_result(key, HandleCommandResult(stdout=completion.result_str()))
 
     @_cli_write_command(
         'upgrade status',
+        'name=format,type=CephChoices,strings=json|json-pretty,req=false',
         desc='Check service versions vs available and target containers')
-    def _upgrade_status(self):
+    def _upgrade_status(self, format='json-pretty'):
+        key = ('upgrade status', format)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
         completion = self.upgrade_status()
         self._orchestrator_wait([completion])
         raise_if_exception(completion)
-        r = {
-            'target_image': completion.result.target_image,
-            'in_progress': completion.result.in_progress,
-            'services_complete': completion.result.services_complete,
-            'message': completion.result.message,
-        }
-        out = json.dumps(r, indent=4)
-        return HandleCommandResult(stdout=out)
+        # `result` walks the promise chain, read it once
+        r = dict(zip(_UPGRADE_STATUS_FIELDS,
+                     _get_upgrade_status_fields(completion.result)))
+        if format == 'json':
+            out = json.dumps(r, separators=(',', ':'))
+        else:
+            out = json.dumps(r, indent=4)
+        return self._cache_result(key, HandleCommandResult(stdout=out))
+
+    def _upgrade_change(self, upgrade_func, *args):
+        # type: (Callable, Any) -> HandleCommandResult
+        """
+        Run one of the upgrade_start/pause/resume/stop calls.  They change
+        the upgrade state, so cached upgrade results are dropped first.
+        """
+        self._result_cache.clear()
+        completion = upgrade_func(*args)
+        self._orchestrator_wait([completion])
+        raise_if_exception(completion)
+        return HandleCommandResult(stdout=completion.result_str())
 
     @_cli_write_command(
         'upgrade start',
@@ -836,34 +951,22 @@ Usage:
         'name=ceph_version,type=CephString,req=false',
         desc='Initiate upgrade')
     def _upgrade_start(self, image=None, ceph_version=None):
-        completion = self.upgrade_start(image, ceph_version)
-        self._orchestrator_wait([completion])
-        raise_if_exception(completion)
-        return HandleCommandResult(stdout=completion.result_str())
+        return self._upgrade_change(self.upgrade_start, image, ceph_version)
 
     @_cli_write_command(
         'upgrade pause',
         desc='Pause an in-progress upgrade')
     def _upgrade_pause(self):
-        completion = self.upgrade_pause()
-        self._orchestrator_wait([completion])
-        raise_if_exception(completion)
-        return HandleCommandResult(stdout=completion.result_str())
+        return self._upgrade_change(self.upgrade_pause)
 
     @_cli_write_command(
         'upgrade resume',
         desc='Resume paused upgrade')
     def _upgrade_resume(self):
-        completion = self.upgrade_resume()
-        self._orchestrator_wait([completion])
-        raise_if_exception(completion)
-        return HandleCommandResult(stdout=completion.result_str())
+        return self._upgrade_change(self.upgrade_resume)
 
     @_cli_write_command(
         'upgrade stop',
         desc='Stop an in-progress upgrade')
     def _upgrade_stop(self):
-        completion = self.upgrade_stop()
-        self._orchestrator_wait([completion])
-        raise_if_exception(completion)
-        return HandleCommandResult(stdout=completion.result_str())
+        return self._upgrade_change(self.upgrade_stop)
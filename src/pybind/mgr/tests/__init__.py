@@ -21,6 +21,7 @@ if 'UNITTEST' in os.environ:
             super(M, self).__init__()
             self._ceph_get_version = mock.Mock()
             self._ceph_get = mock.MagicMock()
+            self._ceph_get_osdmap = mock.MagicMock()
             self._ceph_get_module_option = mock.MagicMock()
             self._ceph_log = mock.MagicMock()
             self._ceph_get_store = lambda _: ''
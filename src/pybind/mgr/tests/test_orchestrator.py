@@ -1,4 +1,5 @@
 from __future__ import absolute_import
+import errno
 import json
 
 from tests import mock
@@ -10,6 +11,7 @@ from orchestrator import raise_if_exception, RGWSpec, Completion, ProgressRefere
 from orchestrator import InventoryNode, ServiceDescription
 from orchestrator import OrchestratorValidationError
 from orchestrator import HostPlacementSpec
+from orchestrator import OrchestratorClientMixin
 
 
 @pytest.mark.parametrize("test_input,expected, require_network",
@@ -214,6 +216,36 @@ def test_with_progress():
     assert c.progress_reference.effective
 
 
+def test_result_str():
+    c = Completion(value=None)
+    c.finalize()
+    assert c.result_str() == ''
+
+    c = Completion(value=2).then(lambda x: ['a', x])
+    c.finalize()
+    assert c.result_str() == 'a\n2'
+
+
+def test_orchestrator_wait_backoff():
+    c = Completion()
+    processed = []
+
+    def remote(_module, meth, completions):
+        assert meth == 'process'
+        processed.append(1)
+        if len(processed) == 4:
+            completions[0].finalize('done')
+
+    mgr = mock.MagicMock()
+    mgr.remote.side_effect = remote
+    client = OrchestratorClientMixin()
+    client.set_mgr(mgr)
+    with mock.patch('orchestrator._interface.time.sleep') as sleep:
+        client._orchestrator_wait([c])
+    assert c.result == 'done'
+    assert [call[0][0] for call in sleep.call_args_list] == [0.01, 0.02, 0.04]
+
+
 def test_exception():
 
     def run(x):
@@ -274,3 +306,41 @@ def test_pretty_print():
 
     assert p.result == 5
 
+
+
+def test_render_table():
+    from orchestrator.module import _render_table
+    out = _render_table(['HOST', 'PATH', 'SIZE'],
+                        [('a', '/dev/sda', '10 GB'), ('hostlong', '/d', 1)],
+                        right_aligned=('SIZE',))
+    assert out == ('HOST     PATH      SIZE \n'
+                   'a        /dev/sda 10 GB \n'
+                   'hostlong /d           1 ')
+    assert _render_table(['HOST', 'PATH'], []) == ''
+
+
+def test_device_light_unknown_device():
+    from orchestrator.module import OrchestratorCli
+    m = OrchestratorCli.__new__(OrchestratorCli)
+    m._root_logger = mock.MagicMock()
+    m._lights = {'ident': {'gone'}, 'fault': set()}
+    m._saved = (frozenset(m.ident), frozenset(m.fault))
+    m._health_cache = {}
+    with mock.patch.object(m, 'get', return_value={'devices': []}), \
+            mock.patch.object(m, 'set_store') as _set_store, \
+            mock.patch.object(m, 'set_health_checks'), \
+            mock.patch.object(m, 'blink_device_light') as _blink:
+        r = m.light_on('ident', 'nope')
+        assert r.retval == -errno.ENOENT
+        assert 'nope' not in m.ident
+        r = m.light_off('ident', 'gone', False)
+        assert r.retval == -errno.ENOENT
+        assert 'gone' in m.ident
+        _blink.assert_not_called()
+        _set_store.assert_not_called()
+
+        # --force still clears the light of a device that went away
+        r = m.light_off('ident', 'gone', True)
+        assert r.retval == -errno.ENOENT
+        assert 'gone' not in m.ident
+        _set_store.assert_called_once()